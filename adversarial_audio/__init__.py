@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""SpectoGAN and PianoGAN: adversarial audio synthesis.
+
+Importing the package is cheap; PyTorch, TensorFlow, librosa and the other heavy
+dependencies are only loaded by the submodules that use them, e.g.
+`from adversarial_audio.spectogan_vocoder import MelInverter`. See
+`adversarial_audio.cli` for the command-line entry points.
+"""
+
+__version__ = '0.1.0'
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""Streaming audio rendering and writing shared by SpectoGAN and PianoGAN.
+
+Audio is produced and written in fixed-size blocks through `soundfile.SoundFile`,
+so memory stays bounded by one block however long the output is, and rendering
+stops as soon as the requested number of seconds has been produced.
+MIDI previews go one step further: notes are trimmed to the requested window
+before synthesis, and previews of files are kept in a small LRU cache.
+Batches of generated waveforms are exported from memory by a thread pool,
+without playback or a read-back from disk, so export also runs headless.
+"""
+
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Length of one rendered/written block, in seconds
+BLOCK_SECONDS = 10.0
+# Number of rendered previews kept by `render_preview`
+PREVIEW_CACHE_SIZE = 32
+
+
+def write_blocks(path, blocks, samplerate, channels=1, subtype=None, append=False, max_seconds=None):
+    """
+    Write an iterable of audio blocks to a sound file without holding more than one block in memory.
+
+    Parameters:
+    - path (str): Output file; the format (WAV, FLAC, ...) follows the extension.
+    - blocks (iterable): float arrays of shape (frames,) or (frames, channels).
+    - samplerate (int): Sampling rate of the blocks.
+    - channels (int): Number of channels.
+    - subtype (str, optional): soundfile subtype, e.g. 'PCM_16' or 'FLOAT'. Default is the format's default.
+    - append (bool): Append to an existing file instead of overwriting it.
+    - max_seconds (float, optional): Stop consuming blocks once this much audio has been written.
+
+    Returns:
+    - int: Number of frames written.
+    """
+    import soundfile as sf
+
+    max_frames = None if max_seconds is None else int(max_seconds * samplerate)
+    if append and os.path.exists(path):
+        audio_file = sf.SoundFile(path, mode='r+')
+        audio_file.seek(0, sf.SEEK_END)
+    else:
+        audio_file = sf.SoundFile(path, mode='w', samplerate=samplerate, channels=channels, subtype=subtype)
+
+    written = 0
+    with audio_file:
+        for block in blocks:
+            if max_frames is not None:
+                block = block[:max_frames - written]
+            audio_file.write(block)
+            written += len(block)
+            if max_frames is not None and written >= max_frames:
+                break
+    return written
+
+
+def iter_array_blocks(audio, samplerate, block_seconds=BLOCK_SECONDS):
+    """
+    Yield consecutive blocks (views, no copies) of an in-memory waveform.
+    """
+    block_size = max(1, int(block_seconds * samplerate))
+    for i in range(0, len(audio), block_size):
+        yield audio[i:i + block_size]
+
+
+def write_audio(path, audio, samplerate, subtype=None, block_seconds=BLOCK_SECONDS):
+    """
+    Write an in-memory waveform block by block, so the file conversion never copies the whole signal.
+    """
+    audio = np.asarray(audio)
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    return write_blocks(path, iter_array_blocks(audio, samplerate, block_seconds), samplerate, channels, subtype)
+
+
+def midi_note_arrays(pm):
+    """
+    Pitch, start, end and velocity arrays of all non-drum notes of a PrettyMIDI object, sorted by start time.
+    """
+    notes = [note for instrument in pm.instruments if not instrument.is_drum for note in instrument.notes]
+    pitch = np.fromiter((note.pitch for note in notes), dtype=np.int16, count=len(notes))
+    start = np.fromiter((note.start for note in notes), dtype=np.float64, count=len(notes))
+    end = np.fromiter((note.end for note in notes), dtype=np.float64, count=len(notes))
+    velocity = np.fromiter((note.velocity for note in notes), dtype=np.float32, count=len(notes))
+    order = np.argsort(start, kind='stable')
+    return pitch[order], start[order], end[order], velocity[order]
+
+
+def peak_gain(start, end, velocity):
+    """
+    Gain that keeps a sum of sine notes within [-1, 1]: the inverse of the largest summed amplitude of sounding notes.
+
+    `PrettyMIDI.synthesize` normalizes by the peak of the whole rendered signal,
+    which a streaming renderer cannot know in advance; this bound is computed from
+    the notes alone, so it never clips and is at most as loud.
+    """
+    if len(start) == 0:
+        return 1.0
+    times = np.concatenate([start, end])
+    amplitude = np.concatenate([velocity, -velocity]) / 127.0
+    # Process note-offs before note-ons at equal times so touching notes are not counted as overlapping
+    order = np.lexsort((amplitude, times))
+    return 1.0 / max(np.max(np.cumsum(amplitude[order])), 1e-6)
+
+
+def iter_note_blocks(pitch, start, end, velocity, sampling_rate=44100, block_seconds=BLOCK_SECONDS,
+                     max_seconds=None, gain=None):
+    """
+    Render notes as summed sine waves, one float32 block at a time, like `PrettyMIDI.synthesize`.
+
+    Parameters:
+    - pitch, start, end, velocity (np.ndarray): Note arrays sorted by start time, e.g. from `midi_note_arrays`.
+    - sampling_rate (int): Sampling rate of the rendered audio.
+    - block_seconds (float): Length of each yielded block.
+    - max_seconds (float, optional): Stop after this many seconds instead of rendering the whole piece.
+    - gain (float, optional): Output gain. Default is `peak_gain` of the notes.
+
+    Yields:
+    - np.ndarray: float32 blocks of at most `block_seconds * sampling_rate` samples.
+    """
+    if gain is None:
+        gain = peak_gain(start, end, velocity)
+    total_seconds = float(end.max()) if len(end) else 0.0
+    if max_seconds is not None:
+        total_seconds = min(total_seconds, max_seconds)
+    total_samples = int(np.ceil(total_seconds * sampling_rate))
+    block_size = max(1, int(block_seconds * sampling_rate))
+
+    # Equal temperament with A4 (MIDI 69) at 440 Hz, as pretty_midi.note_number_to_hz
+    frequency = 440.0 * 2.0 ** ((pitch.astype(np.float64) - 69) / 12)
+    start_sample = np.floor(start * sampling_rate).astype(np.int64)
+    end_sample = np.floor(end * sampling_rate).astype(np.int64)
+    amplitude = velocity / 127.0 * gain
+
+    # Notes are sorted by start: each block admits the notes starting before its end and keeps
+    # only those still sounding, so every note is visited once per block it overlaps
+    next_note, active = 0, []
+    for block_start in range(0, total_samples, block_size):
+        block_end = min(block_start + block_size, total_samples)
+        block = np.zeros(block_end - block_start, dtype=np.float32)
+        while next_note < len(start_sample) and start_sample[next_note] < block_end:
+            active.append(next_note)
+            next_note += 1
+        active = [i for i in active if end_sample[i] > block_start]
+        for i in active:
+            lo = max(start_sample[i], block_start)
+            hi = min(end_sample[i], block_end)
+            samples = np.arange(lo - start_sample[i], hi - start_sample[i], dtype=np.float64)
+            block[lo - block_start:hi - block_start] += (
+                amplitude[i] * np.sin(2 * np.pi * frequency[i] * samples / sampling_rate)).astype(np.float32)
+        yield block
+
+
+def write_midi_audio(pm, path, sampling_rate=44100, max_seconds=None,
+                     block_seconds=BLOCK_SECONDS, subtype=None):
+    """
+    Render a PrettyMIDI object to a sound file block by block; returns the number of frames written.
+    """
+    blocks = iter_note_blocks(*midi_note_arrays(pm), sampling_rate=sampling_rate, block_seconds=block_seconds,
+                              max_seconds=max_seconds)
+    return write_blocks(path, blocks, sampling_rate, subtype=subtype)
+
+
+def trim_notes(pitch, start, end, velocity, window_start, window_end):
+    """
+    Keep only the notes sounding in [window_start, window_end) and shift them so the window starts at 0.
+
+    Notes already sounding at `window_start` keep a negative start, so their phase is rendered correctly.
+    """
+    keep = (start < window_end) & (end > window_start)
+    return pitch[keep], start[keep] - window_start, end[keep] - window_start, velocity[keep]
+
+
+def render_notes(pitch, start, end, velocity, seconds, start_seconds=0.0, sampling_rate=44100):
+    """
+    Render the window [start_seconds, start_seconds + seconds) of note arrays to a float32 waveform.
+    """
+    window = trim_notes(pitch, start, end, velocity, start_seconds, start_seconds + seconds)
+    blocks = iter_note_blocks(*window, sampling_rate=sampling_rate, max_seconds=seconds)
+    return np.concatenate([np.zeros(0, dtype=np.float32), *blocks])
+
+
+@functools.lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def _cached_preview(midi_file, modified_time, seconds, start_seconds, sampling_rate):
+    # `modified_time` is only part of the cache key, so an edited file is rendered again
+    import pretty_midi
+
+    waveform = render_notes(*midi_note_arrays(pretty_midi.PrettyMIDI(midi_file)), seconds, start_seconds,
+                            sampling_rate)
+    waveform.flags.writeable = False
+    return waveform
+
+
+def render_preview(source, seconds=20, start_seconds=0.0, sampling_rate=44100):
+    """
+    Render a short preview of a MIDI piece without synthesizing the rest of it.
+
+    Parameters:
+    - source (str or PrettyMIDI): Path to a MIDI file, or an already loaded PrettyMIDI object.
+    - seconds (float): Length of the preview.
+    - start_seconds (float): Start of the preview window in the piece.
+    - sampling_rate (int): Sampling rate; e.g. 22050 halves the work of a 44100 preview.
+
+    Returns:
+    - np.ndarray: float32 waveform. Previews of files are cached per (file, window, sampling rate)
+      and returned read-only.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        return _cached_preview(path, os.path.getmtime(path), float(seconds), float(start_seconds), int(sampling_rate))
+    return render_notes(*midi_note_arrays(source), seconds, start_seconds, sampling_rate)
+
+
+def normalize_loudness(audio, target_dbfs=-20.0, peak_dbfs=-1.0):
+    """
+    Scale a waveform to an RMS level of `target_dbfs`, limited so its peak stays at or below `peak_dbfs`.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    rms = np.sqrt(np.mean(np.square(audio, dtype=np.float64)))
+    peak = np.max(np.abs(audio)) if audio.size else 0.0
+    if rms == 0.0:
+        return audio
+    gain = min(10 ** (target_dbfs / 20) / rms, 10 ** (peak_dbfs / 20) / peak)
+    return audio * np.float32(gain)
+
+
+def _export_one(path, audio, samplerate, subtype, target_dbfs):
+    if target_dbfs is not None:
+        audio = normalize_loudness(audio, target_dbfs)
+    write_audio(path, audio, samplerate, subtype)
+    return path
+
+
+def export_batch(waveforms, output_dir, samplerate, prefix='generated', audio_format='wav', subtype=None,
+                 target_dbfs=None, num_workers=4, start_index=0, names=None):
+    """
+    Write a batch of in-memory waveforms to audio files from a thread pool.
+
+    Parameters:
+    - waveforms (iterable): float waveforms, e.g. the rows of a (batch, samples) array.
+    - output_dir (str): Directory the files are written to.
+    - samplerate (int): Sampling rate of the waveforms.
+    - prefix (str): File name prefix; files are named `<prefix>_<index>.<audio_format>`.
+    - audio_format (str): 'wav' or 'flac'.
+    - subtype (str, optional): soundfile subtype, e.g. 'PCM_16'. Default is the format's default.
+    - target_dbfs (float, optional): Normalize each waveform to this RMS level in dBFS before writing.
+    - num_workers (int): Number of writer threads; libsndfile releases the GIL while encoding.
+    - start_index (int): Index of the first file, so consecutive batches do not overwrite each other.
+    - names (list, optional): File names without extension, one per waveform, used instead of `<prefix>_<index>`.
+
+    Returns:
+    - list: Paths of the written files, in the order of `waveforms`.
+    """
+    if audio_format not in ('wav', 'flac'):
+        raise ValueError(f"unsupported audio format {audio_format!r}, expected 'wav' or 'flac'")
+    os.makedirs(output_dir, exist_ok=True)
+    waveforms = list(waveforms)
+    if names is None:
+        names = [f'{prefix}_{i:05d}' for i in range(start_index, start_index + len(waveforms))]
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(_export_one, os.path.join(output_dir, f'{name}.{audio_format}'),
+                                   audio, samplerate, subtype, target_dbfs)
+                   for name, audio in zip(names, waveforms)]
+        # result() re-raises the first failed write
+        return [future.result() for future in futures]
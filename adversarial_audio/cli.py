@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""Command-line entry points: featurize, train, generate and vocode.
+
+Parsing the command line imports nothing heavy. Each subcommand imports its own
+framework (PyTorch, TensorFlow, librosa, ...) only when it runs, through
+`load_command`, so `adversarial-audio vocode` never loads TensorFlow and
+`adversarial-audio train pianogan` never loads PyTorch. `startup-benchmark`
+measures the cold start of every subcommand in a fresh interpreter.
+"""
+
+import argparse
+import glob
+import importlib
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules each subcommand needs; imported on demand by `load_command`
+COMMAND_MODULES = {
+    'featurize': ('adversarial_audio.spectogan_features',),
+    'train-spectogan': ('adversarial_audio.spectogan_train', 'adversarial_audio.spectogan_store'),
+    'train-pianogan': ('adversarial_audio.pianogan_train', 'adversarial_audio.pianogan_models',
+                       'adversarial_audio.pianogan_ingest', 'adversarial_audio.pianogan_windows'),
+    'generate-spectogan': ('adversarial_audio.spectogan_models', 'adversarial_audio.spectogan_vocoder',
+                           'adversarial_audio.audio_io'),
+    'generate-pianogan': ('adversarial_audio.pianogan_models', 'adversarial_audio.pianogan_generate'),
+    'vocode': ('adversarial_audio.spectogan_vocoder', 'adversarial_audio.audio_io'),
+}
+
+
+def _featurize(args):
+    from .spectogan_features import featurize_files
+
+    paths = sorted(glob.glob(os.path.join(args.input_dir, '**', '*.wav'), recursive=True))[:args.max_files]
+    featurize_files(paths, args.output_dir, num_workers=args.workers, chunk_size=args.chunk_size)
+
+
+def _train_spectogan(args):
+    import torch
+    import torch.optim as optim
+
+    from .metrics_log import MetricsLogger
+    from .spectogan_checkpoint import CheckpointManager
+    from .spectogan_features import N_MELS
+    from .spectogan_losses import LabelNoiseLoss
+    from .spectogan_models import Discriminator, Generator
+    from .spectogan_store import LogMelDataset, MemmapSpectrogramDataset, make_dataloader, pack_dataset
+    from .spectogan_train import train
+
+    device = torch.device(args.device or ('cuda:0' if torch.cuda.is_available() else 'cpu'))
+    if not os.path.exists(args.store + '.json'):
+        paths = sorted(glob.glob(os.path.join(args.features, '*.npy')))
+        pack_dataset(LogMelDataset(paths, n_frames=args.frames), args.store, names=paths)
+    dataloader = make_dataloader(MemmapSpectrogramDataset(args.store), args.batch_size, num_workers=args.workers)
+
+    model_kwargs = {'channels': 1, 'image_size': (N_MELS, args.frames)}
+    G = Generator(args.latent_size, **model_kwargs).to(device)
+    D = Discriminator(**model_kwargs).to(device)
+    optimizerd = optim.Adam(D.parameters(), lr=0.0002, betas=(0.5, 0.999))
+    optimizerg = optim.Adam(G.parameters(), lr=0.0002, betas=(0.5, 0.999))
+    checkpoints = CheckpointManager(args.checkpoint_dir, keep_last=args.keep_last)
+    with MetricsLogger(args.metrics) as metrics:
+        train(D, G, dataloader, optimizerd, optimizerg, LabelNoiseLoss(device), args.epochs, args.latent_size,
+              device, precision=args.precision, channels_last=args.channels_last, checkpoint=checkpoints,
+              metrics=metrics)
+    checkpoints.close()
+
+
+def _train_pianogan(args):
+    import tensorflow as tf
+
+    from .metrics_log import MetricsLogger
+    from .pianogan_checkpoint import TrainingCheckpoint
+    from .pianogan_ingest import ingest_corpus
+    from .pianogan_models import build_gan, build_model
+    from .pianogan_train import make_train_step, train, wasserstein_loss
+    from .pianogan_windows import create_training_dataset, notes_to_matrix
+
+    tf.random.set_seed(args.seed)
+    tf.random.set_global_generator(tf.random.Generator.from_seed(args.seed))
+    filenames = sorted(glob.glob(os.path.join(args.midi_dir, '**', '*.mid*'), recursive=True))
+    notes, _ = ingest_corpus(filenames, args.cache_dir)
+    dataset = create_training_dataset(notes_to_matrix(notes), args.seq_length, args.batch_size, seed=args.seed)
+
+    generator = build_model('joint_generator', latent_dim=args.latent_dim, seq_len=args.seq_length)
+    discriminator = build_model('joint_discriminator', seq_len=args.seq_length)
+    gan = build_gan(generator, discriminator, args.latent_dim)
+    discriminator.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(learning_rate=0.00005))
+    gan.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(learning_rate=0.00005))
+
+    train_step = make_train_step(generator, discriminator, gan.optimizer, discriminator.optimizer, args.latent_dim)
+    checkpoint = TrainingCheckpoint(args.checkpoint_dir, generator, discriminator, gan.optimizer,
+                                    discriminator.optimizer, keep_last=args.keep_last)
+    with MetricsLogger(args.metrics) as metrics:
+        train(train_step, dataset, args.epochs, checkpoint=checkpoint, metrics=metrics)
+    generator.save_weights(args.weights)
+    print(f"Generator weights saved to {args.weights}")
+
+
+def _generate_spectogan(args):
+    import torch
+
+    from .audio_io import export_batch
+    from .spectogan_checkpoint import CheckpointManager
+    from .spectogan_features import HOP_LENGTH, N_FFT, N_MELS, denormalize_db, log_mel_to_power
+    from .spectogan_models import Generator
+    from .spectogan_vocoder import MelInverter
+
+    device = torch.device(args.device or ('cuda:0' if torch.cuda.is_available() else 'cpu'))
+    state = CheckpointManager(args.checkpoint_dir).load_latest()
+    if state is None:
+        raise SystemExit(f"no checkpoint found in {args.checkpoint_dir}")
+    G = Generator(args.latent_size, channels=1, image_size=(N_MELS, args.frames)).to(device)
+    G.load_state_dict(state['generator'])
+    G.eval()
+
+    torch.manual_seed(args.seed)
+    inverter = MelInverter(args.sr, N_FFT, HOP_LENGTH, N_MELS, n_iter=args.iterations, device=device,
+                           momentum=0.99, init='pghi')
+    for start in range(0, args.count, args.batch_size):
+        count = min(args.batch_size, args.count - start)
+        with torch.no_grad():
+            fakes = G(torch.randn(count, args.latent_size, 1, 1, device=device))
+        audio = inverter(log_mel_to_power(denormalize_db(fakes[:, 0].cpu().numpy())))
+        export_batch(audio, args.output_dir, args.sr, prefix='spectogan', audio_format=args.format,
+                     target_dbfs=args.target_dbfs, start_index=start)
+    print(f"Wrote {args.count} clips to {args.output_dir}")
+
+
+def _generate_pianogan(args):
+    from .pianogan_generate import generate_midi_files
+    from .pianogan_models import build_model
+
+    generator = build_model('joint_generator', weights_path=args.weights, latent_dim=args.latent_dim,
+                            seq_len=args.seq_length)
+    paths = generate_midi_files(generator, args.count, args.output_dir, seed=args.seed, latent_dim=args.latent_dim)
+    print(f"Wrote {len(paths)} MIDI files to {args.output_dir}")
+
+
+def _vocode(args):
+    import numpy as np
+
+    from .audio_io import export_batch
+    from .spectogan_features import log_mel_to_power
+    from .spectogan_vocoder import MelInverter
+
+    # Spectrograms of equal shape are inverted together in batches
+    by_shape = {}
+    for path in args.inputs:
+        log_mel = np.load(path)
+        by_shape.setdefault(log_mel.shape, []).append((os.path.splitext(os.path.basename(path))[0], log_mel))
+    for (n_mels, _), items in by_shape.items():
+        inverter = MelInverter(args.sr, args.n_fft, args.hop_length, n_mels, n_iter=args.iterations,
+                               tol=args.tol, device=args.device, momentum=args.momentum, init=args.init)
+        for start in range(0, len(items), args.batch_size):
+            names, log_mels = zip(*items[start:start + args.batch_size])
+            audio = inverter(log_mel_to_power(np.stack(log_mels)))
+            export_batch(audio, args.output_dir, args.sr, audio_format=args.format, target_dbfs=args.target_dbfs,
+                         names=names)
+    print(f"Vocoded {len(args.inputs)} spectrograms to {args.output_dir}")
+
+
+COMMAND_HANDLERS = {
+    'featurize': _featurize,
+    'train-spectogan': _train_spectogan,
+    'train-pianogan': _train_pianogan,
+    'generate-spectogan': _generate_spectogan,
+    'generate-pianogan': _generate_pianogan,
+    'vocode': _vocode,
+}
+
+
+def load_command(name):
+    """
+    Import everything a subcommand needs and return its handler.
+    """
+    for module in COMMAND_MODULES[name]:
+        importlib.import_module(module)
+    return COMMAND_HANDLERS[name]
+
+
+# Heavy dependencies whose import `benchmark_startup` reports for each subcommand
+HEAVY_MODULES = ('numpy', 'torch', 'tensorflow', 'librosa', 'pretty_midi', 'pandas', 'soundfile', 'PIL')
+
+
+def benchmark_startup(commands=None, repeats=3):
+    """
+    Measure the cold start of each subcommand: a fresh interpreter that imports the CLI and loads the command.
+
+    The first row, 'cli', only imports the CLI, i.e. the cost of parsing the command line.
+
+    Parameters:
+    - commands (list, optional): Subcommand keys of `COMMAND_MODULES`. Default is all of them.
+    - repeats (int): Fresh interpreters started per subcommand.
+
+    Returns:
+    - dict: Per subcommand, the median wall-clock seconds including interpreter startup, the heavy
+      dependencies it imported, and the error if it could not be loaded (e.g. a missing dependency).
+    """
+    report = {}
+    for name in ['cli'] + list(commands or COMMAND_MODULES):
+        load = '' if name == 'cli' else f'load_command({name!r}); '
+        code = (f'import sys; from adversarial_audio.cli import HEAVY_MODULES, load_command; {load}'
+                f'print(",".join(m for m in HEAVY_MODULES if m in sys.modules))')
+        times, result = [], None
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+            times.append(time.perf_counter() - start_time)
+        if result.returncode == 0:
+            imported = result.stdout.strip()
+            report[name] = {'seconds': statistics.median(times), 'imports': imported.split(',') if imported else [],
+                            'error': None}
+            print(f"{name:>20}: {report[name]['seconds']:7.3f}s, imports: {imported or '-'}")
+        else:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f'exit {result.returncode}'
+            report[name] = {'seconds': None, 'imports': None, 'error': error}
+            print(f"{name:>20}: failed, {error}")
+    return report
+
+
+def _startup_benchmark(args):
+    unknown = sorted(set(args.commands) - set(COMMAND_MODULES))
+    if unknown:
+        raise SystemExit(f"unknown subcommands: {', '.join(unknown)}")
+    benchmark_startup(args.commands or None, args.repeats)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='adversarial-audio', description='SpectoGAN and PianoGAN tools.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    featurize = commands.add_parser('featurize', help='Compute log-mel .npy features of a directory of WAV files.')
+    featurize.add_argument('input_dir')
+    featurize.add_argument('output_dir')
+    featurize.add_argument('--max-files', type=int, default=None)
+    featurize.add_argument('--workers', type=int, default=None)
+    featurize.add_argument('--chunk-size', type=int, default=32)
+    featurize.set_defaults(key='featurize')
+
+    train = commands.add_parser('train', help='Train a model.').add_subparsers(dest='model', required=True)
+    spectogan = train.add_parser('spectogan', help='Train SpectoGAN on native log-mel features.')
+    spectogan.add_argument('--features', required=True, help='Directory of .npy log-mel features.')
+    spectogan.add_argument('--store', default='train_store', help='Path prefix of the packed memmap store.')
+    spectogan.add_argument('--frames', type=int, default=32)
+    spectogan.add_argument('--epochs', type=int, default=20)
+    spectogan.add_argument('--batch-size', type=int, default=32)
+    spectogan.add_argument('--workers', type=int, default=None, help='DataLoader workers. Default sizes to the cores.')
+    spectogan.add_argument('--latent-size', type=int, default=256)
+    spectogan.add_argument('--precision', choices=('fp32', 'bf16', 'fp16'), default='fp32')
+    spectogan.add_argument('--channels-last', action='store_true')
+    spectogan.add_argument('--device', default=None)
+    spectogan.add_argument('--checkpoint-dir', default='checkpoints/spectogan')
+    spectogan.add_argument('--keep-last', type=int, default=3)
+    spectogan.add_argument('--metrics', default='logs/spectogan_metrics.csv')
+    spectogan.set_defaults(key='train-spectogan')
+
+    pianogan = train.add_parser('pianogan', help='Train the joint PianoGAN model on a MIDI corpus.')
+    pianogan.add_argument('--midi-dir', required=True)
+    pianogan.add_argument('--cache-dir', default='note_cache')
+    pianogan.add_argument('--seq-length', type=int, default=256)
+    pianogan.add_argument('--batch-size', type=int, default=256)
+    pianogan.add_argument('--latent-dim', type=int, default=256)
+    pianogan.add_argument('--epochs', type=int, default=20)
+    pianogan.add_argument('--seed', type=int, default=42)
+    pianogan.add_argument('--checkpoint-dir', default='checkpoints/pianogan')
+    pianogan.add_argument('--keep-last', type=int, default=3)
+    pianogan.add_argument('--metrics', default='logs/pianogan_metrics.csv')
+    pianogan.add_argument('--weights', default='pianogan_generator.weights.h5')
+    pianogan.set_defaults(key='train-pianogan')
+
+    generate = commands.add_parser('generate', help='Generate samples.').add_subparsers(dest='model', required=True)
+    spectogan = generate.add_parser('spectogan', help='Generate audio clips from the latest SpectoGAN checkpoint.')
+    spectogan.add_argument('--checkpoint-dir', default='checkpoints/spectogan')
+    spectogan.add_argument('--output-dir', default='generated_audio')
+    spectogan.add_argument('--count', type=int, default=16)
+    spectogan.add_argument('--batch-size', type=int, default=64)
+    spectogan.add_argument('--frames', type=int, default=32)
+    spectogan.add_argument('--latent-size', type=int, default=256)
+    spectogan.add_argument('--sr', type=int, default=16000)
+    spectogan.add_argument('--iterations', type=int, default=16)
+    spectogan.add_argument('--format', choices=('wav', 'flac'), default='wav')
+    spectogan.add_argument('--target-dbfs', type=float, default=None)
+    spectogan.add_argument('--seed', type=int, default=0)
+    spectogan.add_argument('--device', default=None)
+    spectogan.set_defaults(key='generate-spectogan')
+
+    pianogan = generate.add_parser('pianogan', help='Generate MIDI files from saved PianoGAN generator weights.')
+    pianogan.add_argument('--weights', default='pianogan_generator.weights.h5')
+    pianogan.add_argument('--output-dir', default='generated_samples')
+    pianogan.add_argument('--count', type=int, default=16)
+    pianogan.add_argument('--seq-length', type=int, default=256)
+    pianogan.add_argument('--latent-dim', type=int, default=256)
+    pianogan.add_argument('--seed', type=int, default=None)
+    pianogan.set_defaults(key='generate-pianogan')
+
+    vocode = commands.add_parser('vocode', help='Invert .npy log-mel spectrograms (dB) to audio files.')
+    vocode.add_argument('inputs', nargs='+')
+    vocode.add_argument('--output-dir', default='vocoded')
+    vocode.add_argument('--sr', type=int, default=16000)
+    vocode.add_argument('--n-fft', type=int, default=2048)
+    vocode.add_argument('--hop-length', type=int, default=512)
+    vocode.add_argument('--iterations', type=int, default=16)
+    vocode.add_argument('--tol', type=float, default=None)
+    vocode.add_argument('--momentum', type=float, default=0.99)
+    vocode.add_argument('--init', choices=('random', 'pghi'), default='pghi')
+    vocode.add_argument('--batch-size', type=int, default=64)
+    vocode.add_argument('--format', choices=('wav', 'flac'), default='wav')
+    vocode.add_argument('--target-dbfs', type=float, default=None)
+    vocode.add_argument('--device', default='cpu')
+    vocode.set_defaults(key='vocode')
+
+    startup = commands.add_parser('startup-benchmark', help='Measure the cold start time of each subcommand.')
+    startup.add_argument('commands', nargs='*', metavar='command',
+                         help=f"Subcommands to measure, any of {', '.join(COMMAND_MODULES)}. Default is all of them.")
+    startup.add_argument('--repeats', type=int, default=3)
+    startup.set_defaults(key=None)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'startup-benchmark':
+        _startup_benchmark(args)
+    else:
+        load_command(args.key)(args)
+
+
+if __name__ == '__main__':
+    main()
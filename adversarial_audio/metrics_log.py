@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Append-only training metrics log shared by SpectoGAN and PianoGAN.
+
+Training loops record one row per step (losses, scores, data-wait and compute
+times, samples/sec) through `MetricsLogger`, which buffers rows and appends them
+to a CSV or JSON Lines file. Plots read the log back with `read_metrics` instead
+of using pasted arrays. Resumed runs keep appending to the same file, while a
+fresh run calls `reset` first so its rows are not mixed with an older run's.
+"""
+
+import csv
+import json
+import os
+
+
+class MetricsLogger:
+    def __init__(self, path, flush_every=256):
+        """
+        Initialize the MetricsLogger.
+        Parameters:
+        - path (str): Log file; `.jsonl` writes JSON Lines, anything else CSV.
+        - flush_every (int): Number of buffered rows that triggers a write.
+        """
+        self.path = path
+        self.format = 'jsonl' if path.endswith('.jsonl') else 'csv'
+        self.flush_every = flush_every
+        self._rows = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def log(self, **row):
+        """
+        Buffer one row of metrics.
+        """
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_every:
+            self.flush()
+
+    def reset(self):
+        """
+        Drop the buffered rows and truncate the log file, for a run that starts from scratch.
+        """
+        self._rows = []
+        open(self.path, 'w').close()
+
+    def _csv_fields(self):
+        # An existing log keeps its header, so appended rows always line up with it
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, newline='') as f:
+                return next(csv.reader(f)), False
+        fields = []
+        for row in self._rows:
+            fields.extend(key for key in row if key not in fields)
+        return fields, True
+
+    def flush(self):
+        """
+        Append the buffered rows to the log file.
+        """
+        if not self._rows:
+            return
+        if self.format == 'jsonl':
+            with open(self.path, 'a') as f:
+                f.writelines(json.dumps(row) + '\n' for row in self._rows)
+        else:
+            fields, write_header = self._csv_fields()
+            with open(self.path, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+                if write_header:
+                    writer.writeheader()
+                writer.writerows(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_metrics(path):
+    """
+    Read a metrics log written by `MetricsLogger` into a pandas DataFrame with one row per step.
+    """
+    import pandas as pd
+
+    if path.endswith('.jsonl'):
+        return pd.read_json(path, lines=True)
+    return pd.read_csv(path)
+
+
+def epoch_summary(metrics, columns):
+    """
+    Per-epoch means of the given columns, indexed by epoch.
+
+    If a resumed run logged an epoch again, only its last attempt is used.
+    """
+    last_attempt = metrics.drop_duplicates('step', keep='last')
+    return last_attempt.groupby('epoch')[list(columns)].mean()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Asynchronous, resumable training checkpoints for PianoGAN.
+
+Model weights, optimizer slots, the TF random generator, the dataset iterator
+and the epoch/step counters are tracked by one `tf.train.Checkpoint` and saved
+through a `tf.train.CheckpointManager` that keeps the last K checkpoints. TF
+writes checkpoints to temporary files and renames them, and with async saving
+enabled it writes them from a background thread. The metric history and the
+NumPy RNG state go to a JSON file next to each checkpoint, written atomically
+before the checkpoint itself, so every checkpoint on disk has its sidecar.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+import tensorflow as tf
+
+
+def _numpy_rng_state():
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return [name, keys.tolist(), pos, has_gauss, cached_gaussian]
+
+
+def _set_numpy_rng_state(state):
+    name, keys, pos, has_gauss, cached_gaussian = state
+    np.random.set_state((name, np.asarray(keys, dtype=np.uint32), pos, has_gauss, cached_gaussian))
+
+
+class TrainingCheckpoint:
+    def __init__(self, directory, generator, discriminator, generator_optimizer, discriminator_optimizer,
+                 keep_last=3, async_save=True, prefix='ckpt'):
+        """Tracks the full training state of a PianoGAN pair in `directory`, keeping the last `keep_last` saves.
+
+        Checkpoints are named `<prefix>-<step>`; other files in the directory are left alone.
+
+        The global TF random generator is tracked as well, so train steps should
+        draw their noise from it (as `make_train_step` does).
+        """
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.step = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.checkpoint = tf.train.Checkpoint(generator=generator,
+                                              discriminator=discriminator,
+                                              generator_optimizer=generator_optimizer,
+                                              discriminator_optimizer=discriminator_optimizer,
+                                              rng=tf.random.get_global_generator(),
+                                              epoch=self.epoch,
+                                              step=self.step)
+        self.manager = tf.train.CheckpointManager(self.checkpoint, directory, max_to_keep=keep_last,
+                                                  checkpoint_name=prefix)
+        self.prefix = prefix
+        self.sidecar_pattern = re.compile(re.escape(prefix) + r'-\d+\.json')
+        self.options = tf.train.CheckpointOptions(experimental_enable_async_checkpoint=async_save)
+
+    def track_iterator(self, iterator):
+        """Adds a dataset iterator, so its position and shuffle state are saved and restored too."""
+        self.checkpoint.iterator = iterator
+
+    def save(self, epoch, step, history):
+        """Starts saving the state after `epoch` completed epochs; returns the checkpoint prefix."""
+        self.epoch.assign(epoch)
+        self.step.assign(step)
+
+        # Written first: a crash before the manager saves leaves only a stray sidecar, which the next save removes
+        sidecar_path = os.path.join(self.manager.directory, f'{self.prefix}-{step}.json')
+        sidecar = {'history': history, 'numpy_rng': _numpy_rng_state()}
+        with open(sidecar_path + '.tmp', 'w') as f:
+            json.dump(sidecar, f)
+        os.replace(sidecar_path + '.tmp', sidecar_path)
+
+        path = self.manager.save(checkpoint_number=step, options=self.options)
+
+        # The manager rotates its own files; drop the sidecars of checkpoints it removed
+        kept = {prefix + '.json' for prefix in self.manager.checkpoints}
+        for name in os.listdir(self.manager.directory):
+            sidecar_path = os.path.join(self.manager.directory, name)
+            if self.sidecar_pattern.fullmatch(name) and sidecar_path not in kept:
+                os.remove(sidecar_path)
+        return path
+
+    def wait(self):
+        """Blocks until an asynchronous save has been written."""
+        if hasattr(self.checkpoint, 'sync'):
+            self.checkpoint.sync()
+
+    def restore(self):
+        """Restores the latest checkpoint, if any.
+
+        Returns (epochs completed, step, history), or (0, 0, None) if nothing was saved yet.
+        """
+        path = self.manager.latest_checkpoint
+        if path is None:
+            return 0, 0, None
+        self.checkpoint.restore(path)
+        with open(path + '.json') as f:
+            sidecar = json.load(f)
+        _set_numpy_rng_state(sidecar['numpy_rng'])
+        return int(self.epoch.numpy()), int(self.step.numpy()), sidecar['history']
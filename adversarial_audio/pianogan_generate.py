@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Batched sample generation for PianoGAN.
+
+Pieces are generated in batched forward passes from a seeded noise source,
+post-processed with whole-array operations (scale, clip, pitch quantization,
+timing grid) and written to MIDI without per-row pandas iteration.
+"""
+
+import os
+
+import numpy as np
+
+from .pianogan_notes import NOTE_DTYPE
+
+# Constant timing used when the generator only produces pitch
+DEFAULT_STEP = 0.025
+DEFAULT_DURATION = 0.3
+# Shortest note kept from a joint generator's duration output, in seconds
+MIN_DURATION = 0.01
+
+
+def generate_samples(generator, count, seed=None, latent_dim=256, batch_size=256) -> np.ndarray:
+    """Returns the raw generator outputs for `count` pieces, computed in batches of `batch_size`."""
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((count, latent_dim), dtype=np.float32)
+    return np.concatenate([np.asarray(generator(noise[i:i + batch_size], training=False))
+                           for i in range(0, count, batch_size)])
+
+
+def postprocess(samples, vocab_size=128, step=DEFAULT_STEP, duration=DEFAULT_DURATION, grid=None,
+                min_duration=MIN_DURATION) -> np.ndarray:
+    """Returns a (count, seq_len) structured note array for raw generator outputs.
+
+    Pitch outputs are scaled by `vocab_size`, clipped to the MIDI range and
+    rounded to integers. Pitch-only outputs of shape (count, seq_len) are placed
+    every `step` seconds and last `duration` seconds; joint outputs of shape
+    (count, seq_len, 3) carry their own step and duration, which are clipped to
+    be non-negative and at least `min_duration`. If `grid` is given, start and
+    end times are snapped to multiples of it.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.ndim == 3:
+        pitch = np.clip(np.rint(samples[..., 0] * vocab_size), 0, 127)
+        steps = np.maximum(samples[..., 1], 0.0)
+        durations = np.maximum(samples[..., 2], min_duration)
+    else:
+        pitch = np.clip(np.rint(samples * vocab_size), 0, 127)
+        steps = np.full(pitch.shape, step)
+        durations = np.full(pitch.shape, duration)
+
+    # Each note starts `step` after the previous one, the first one `step` after 0
+    start = np.cumsum(steps, axis=-1)
+    end = start + durations
+    if grid:
+        start = np.rint(start / grid) * grid
+        end = np.maximum(np.rint(end / grid) * grid, start + grid)
+
+    notes = np.empty(pitch.shape, dtype=NOTE_DTYPE)
+    notes['pitch'] = pitch
+    notes['start'] = start
+    notes['end'] = end
+    notes['step'] = np.diff(start, axis=-1, prepend=0.0)
+    notes['duration'] = end - start
+    return notes
+
+
+def build_midi(pitch, start, end, instrument_name='Acoustic Grand Piano', velocity=100) -> 'pretty_midi.PrettyMIDI':
+    """Returns a single-instrument PrettyMIDI object for note arrays."""
+    import pretty_midi
+
+    pm = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(program=pretty_midi.instrument_name_to_program(instrument_name))
+    instrument.notes = [pretty_midi.Note(velocity=velocity, pitch=p, start=s, end=e)
+                        for p, s, e in zip(np.asarray(pitch, dtype=int).tolist(),
+                                           np.asarray(start, dtype=float).tolist(),
+                                           np.asarray(end, dtype=float).tolist())]
+    pm.instruments.append(instrument)
+    return pm
+
+
+def write_midi(notes, out_file, instrument_name='Acoustic Grand Piano', velocity=100) -> 'pretty_midi.PrettyMIDI':
+    """Writes a structured note array to a MIDI file and returns the PrettyMIDI object."""
+    pm = build_midi(notes['pitch'], notes['start'], notes['end'], instrument_name, velocity)
+    pm.write(out_file)
+    return pm
+
+
+def generate_midi_files(generator, count, output_dir, seed=None, latent_dim=256, batch_size=256,
+                        prefix='generated', **postprocess_kwargs):
+    """Generates `count` pieces and writes them as MIDI files; returns the file paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    pieces = postprocess(generate_samples(generator, count, seed, latent_dim, batch_size), **postprocess_kwargs)
+    paths = []
+    for i, notes in enumerate(pieces):
+        path = os.path.join(output_dir, f'{prefix}_{i:05d}.midi')
+        write_midi(notes, path)
+        paths.append(path)
+    return paths
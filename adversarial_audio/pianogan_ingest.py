@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Multi-process Maestro corpus ingestion for PianoGAN.
+
+MIDI files are parsed across a process pool and their note arrays are streamed
+back as they finish. Corrupt, empty or multi-instrument files are logged and
+skipped instead of aborting the whole corpus build.
+"""
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .pianogan_notes import NOTE_DTYPE, load_notes_cached
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_file(path, cache_dir):
+    """Worker entry point: returns (path, notes, error) without raising."""
+    try:
+        return path, load_notes_cached(path, cache_dir), None
+    except Exception as e:  # pretty_midi/mido raise a wide range of errors on bad files
+        return path, None, f'{type(e).__name__}: {e}'
+
+
+def iter_corpus(filenames, cache_dir, num_workers=None, stats=None, verbose=True):
+    """Yields (path, notes) for each successfully parsed file, in completion order.
+
+    If `stats` is a dict it is filled with the file, note and failure counts and
+    the throughput once the iteration finishes.
+    """
+    stats = {} if stats is None else stats
+    stats.update(files=0, notes=0, failed=[], seconds=0.0)
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(_parse_file, f, cache_dir): f for f in filenames}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                path, notes, error = future.result()
+            except Exception as e:  # the worker itself died, e.g. BrokenProcessPool
+                path, notes, error = futures[future], None, f'{type(e).__name__}: {e}'
+
+            if error is not None:
+                logger.warning('Skipping %s: %s', path, error)
+                stats['failed'].append((path, error))
+            else:
+                stats['files'] += 1
+                stats['notes'] += len(notes)
+                yield path, notes
+
+            if verbose:
+                elapsed = time.perf_counter() - start_time
+                print(f"\rParsed: {done}/{len(futures)} files ({done / max(elapsed, 1e-9):.1f} files/sec)", end='')
+
+    stats['seconds'] = time.perf_counter() - start_time
+    stats['files_per_sec'] = len(filenames) / max(stats['seconds'], 1e-9)
+    stats['notes_per_sec'] = stats['notes'] / max(stats['seconds'], 1e-9)
+    if verbose:
+        print(f"\nIngested {stats['files']} files ({stats['notes']} notes) in {stats['seconds']:.1f}s, "
+              f"{stats['notes_per_sec']:.0f} notes/sec, skipped {len(stats['failed'])}")
+
+
+def ingest_corpus(filenames, cache_dir, num_workers=None, verbose=True):
+    """Returns the concatenated notes of all parseable files, in `filenames` order, and the ingestion stats."""
+    stats = {}
+    parsed = dict(iter_corpus(filenames, cache_dir, num_workers=num_workers, stats=stats, verbose=verbose))
+    # Concatenate in input order so the corpus is reproducible regardless of completion order
+    arrays = [parsed[f] for f in filenames if f in parsed]
+    notes = np.concatenate(arrays) if arrays else np.empty(0, dtype=NOTE_DTYPE)
+    return notes, stats
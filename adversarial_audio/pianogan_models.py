@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""Generator and discriminator models for PianoGAN.
+
+`build_generator`/`build_discriminator` model a single note feature as a
+(seq_len,) sequence, so a piece needs three pairs. The joint models share one
+trunk over all three features: the generator emits (seq_len, 3) pitch/step/
+duration windows and the discriminator scores them, which cuts parameters,
+optimizer state and per-step dispatch about threefold.
+
+Builders are silent unless `verbose=True`. `build_model` is the factory used by
+the scripts: it takes the same size keywords for every kind, caches each
+architecture's JSON config after the first build, can load weights, and can
+return a `LazyModel` that is only built on first use, so workers that never
+touch a model never pay for it.
+"""
+
+import functools
+import time
+
+import tensorflow as tf
+from tensorflow.keras.layers import (BatchNormalization, Concatenate, Conv1D, Conv1DTranspose, Dense, Flatten, Input,
+                                     MaxPooling1D, Reshape)
+from tensorflow.keras.models import Model
+
+from .pianogan_train import make_train_step, wasserstein_loss
+
+# Pitch, step and duration
+NUM_FEATURES = 3
+
+
+def _quiet(*args):
+    """Stands in for `print` when a builder is not verbose."""
+
+
+def build_generator(latent_dim, seq_len, verbose=False):
+    log = print if verbose else _quiet
+    input_layer = Input(shape=(latent_dim,))
+    log("Latent Dimension:", latent_dim)
+
+    x = Dense(128, activation='relu')(input_layer)
+    log("After Dense(128):", x.shape)
+
+    x = Reshape((128, 1))(x)
+    log("After Reshape:", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    x = Conv1DTranspose(64, kernel_size=5, activation='relu', padding='same')(x)
+    log("After Conv1DTranspose(64):", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    x = MaxPooling1D(2)(x)
+    log("After MaxPooling1D:", x.shape)
+
+    x = Conv1DTranspose(32, kernel_size=5, activation='relu', padding='same')(x)
+    log("After Conv1DTranspose(32):", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    x = MaxPooling1D(2)(x)
+    log("After MaxPooling1D:", x.shape)
+
+    x = Conv1DTranspose(16, kernel_size=5, activation='relu', padding='same')(x)
+    log("After Conv1DTranspose(16):", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    x = MaxPooling1D(2)(x)
+    log("After MaxPooling1D:", x.shape)
+
+    x = Conv1DTranspose(4, kernel_size=5, activation='relu', padding='same')(x)
+    log("After Conv1DTranspose(4):", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    # Modify the Flatten layer to ensure compatibility with the subsequent Dense layer
+    x = Flatten()(x)
+    log("After Flatten:", x.shape)
+
+    output_layer = Dense(seq_len, activation='tanh')(x)
+    log("After Dense:", output_layer.shape)
+
+    return Model(inputs=input_layer, outputs=output_layer, name='generator')
+
+
+def build_discriminator(input_dim, verbose=False):
+    log = print if verbose else _quiet
+    input_layer = Input(shape=(input_dim,))
+    log("Discriminator Input Dimensions:", input_dim)
+
+    x = Reshape((input_dim, 1))(input_layer)
+    log("After Reshape:", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    x = MaxPooling1D(2)(x)
+    log("After MaxPooling1D:", x.shape)
+
+    x = Conv1D(16, kernel_size=5, activation='relu', padding='same')(x)
+    log("After Conv1D(16):", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    x = MaxPooling1D(2)(x)
+    log("After MaxPooling1D:", x.shape)
+
+    x = Conv1D(32, kernel_size=5, activation='relu', padding='same')(x)
+    log("After Conv1D(32):", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    x = MaxPooling1D(2)(x)
+    log("After MaxPooling1D:", x.shape)
+
+    x = Conv1D(64, kernel_size=5, activation='relu', padding='same')(x)
+    log("After Conv1D(64):", x.shape)
+
+    x = BatchNormalization()(x)
+    log("After BatchNormalization:", x.shape)
+
+    x = MaxPooling1D(2)(x)
+    log("After MaxPooling1D:", x.shape)
+
+    x = Flatten()(x)
+    log("After Flatten:", x.shape)
+
+    output_layer = Dense(1, activation='sigmoid')(x)
+    log("After Dense:", output_layer.shape)
+
+    model = Model(inputs=input_layer, outputs=output_layer, name='discriminator')
+    return model
+
+
+def build_gan(generator, discriminator, latent_dim=256):
+    discriminator.trainable = True
+    input_layer = Input(shape=(latent_dim,))
+    generated_sequence = generator(input_layer)
+    discriminator_output = discriminator(generated_sequence)
+    model = Model(inputs=input_layer, outputs=discriminator_output, name='gan')
+    return model
+
+
+def build_joint_generator(latent_dim, seq_len, num_features=NUM_FEATURES, verbose=False):
+    """Returns a generator of (seq_len, num_features) note windows, with the per-feature generator's trunk.
+
+    Each feature has its own output head over the shared trunk: pitch is a sigmoid
+    in [0, 1], like the pitch column of `notes_to_matrix`, while step and duration
+    are softplus outputs, non-negative and unbounded like the seconds they model.
+    """
+    log = print if verbose else _quiet
+    input_layer = Input(shape=(latent_dim,))
+    x = Dense(128, activation='relu')(input_layer)
+    x = Reshape((128, 1))(x)
+    x = BatchNormalization()(x)
+    for filters in (64, 32, 16):
+        x = Conv1DTranspose(filters, kernel_size=5, activation='relu', padding='same')(x)
+        x = BatchNormalization()(x)
+        x = MaxPooling1D(2)(x)
+    x = Conv1DTranspose(4, kernel_size=5, activation='relu', padding='same')(x)
+    x = BatchNormalization()(x)
+    x = Flatten()(x)
+    # One small head per feature instead of one generator per feature
+    heads = [Reshape((seq_len, 1))(Dense(seq_len, activation='sigmoid' if i == 0 else 'softplus')(x))
+             for i in range(num_features)]
+    output_layer = Concatenate(axis=-1)(heads)
+    log("Joint generator output:", output_layer.shape)
+    return Model(inputs=input_layer, outputs=output_layer, name='joint_generator')
+
+
+def build_joint_discriminator(seq_len, num_features=NUM_FEATURES, verbose=False):
+    """Returns a discriminator of (seq_len, num_features) note windows, with the per-feature discriminator's trunk."""
+    log = print if verbose else _quiet
+    input_layer = Input(shape=(seq_len, num_features))
+    x = BatchNormalization()(input_layer)
+    x = MaxPooling1D(2)(x)
+    for filters in (16, 32, 64):
+        x = Conv1D(filters, kernel_size=5, activation='relu', padding='same')(x)
+        x = BatchNormalization()(x)
+        x = MaxPooling1D(2)(x)
+    x = Flatten()(x)
+    log("Joint discriminator features:", x.shape)
+    output_layer = Dense(1, activation='sigmoid')(x)
+    return Model(inputs=input_layer, outputs=output_layer, name='joint_discriminator')
+
+
+def _rmsprop():
+    return tf.keras.optimizers.RMSprop(learning_rate=0.00005)
+
+
+def benchmark_joint_training(latent_dim=256, seq_len=256, batch_size=256, steps=20, device='/CPU:0'):
+    """Prints steps/sec and parameter counts of three per-feature pairs against one joint pair.
+
+    One step of the per-feature setup runs all three compiled train steps, so
+    both variants consume the same (batch_size, seq_len, 3) windows per step.
+    Optimizer state scales with the parameter count (one RMSprop slot each).
+    """
+    report = {}
+    with tf.device(device):
+        real_data = tf.random.uniform((batch_size, seq_len, NUM_FEATURES))
+
+        separate_steps, separate_params = [], 0
+        for i in range(NUM_FEATURES):
+            generator, discriminator = build_generator(latent_dim, seq_len), build_discriminator(seq_len)
+            separate_params += generator.count_params() + discriminator.count_params()
+            step = make_train_step(generator, discriminator, _rmsprop(), _rmsprop(), latent_dim, wasserstein_loss)
+            separate_steps.append((i, step))
+
+        generator, discriminator = build_joint_generator(latent_dim, seq_len), build_joint_discriminator(seq_len)
+        joint_params = generator.count_params() + discriminator.count_params()
+        joint_step = make_train_step(generator, discriminator, _rmsprop(), _rmsprop(), latent_dim, wasserstein_loss)
+
+        variants = {
+            'separate': (lambda: [[loss.numpy() for loss in step(real_data[:, :, i])] for i, step in separate_steps],
+                         separate_params),
+            'joint': (lambda: [loss.numpy() for loss in joint_step(real_data)], joint_params),
+        }
+        for name, (run_step, params) in variants.items():
+            # The first call pays for tracing
+            run_step()
+            start_time = time.perf_counter()
+            for _ in range(steps):
+                run_step()
+            report[name] = {'steps_per_sec': steps / (time.perf_counter() - start_time), 'params': params}
+            print(f"{name:>8}: {report[name]['steps_per_sec']:8.2f} steps/sec, {params:,} parameters")
+    return report
+
+
+MODEL_BUILDERS = {
+    'generator': build_generator,
+    'discriminator': build_discriminator,
+    'joint_generator': build_joint_generator,
+    'joint_discriminator': build_joint_discriminator,
+}
+
+# The size keywords of `build_model` each builder takes, in its positional order
+MODEL_SIZES = {
+    'generator': ('latent_dim', 'seq_len'),
+    'discriminator': ('seq_len',),
+    'joint_generator': ('latent_dim', 'seq_len', 'num_features'),
+    'joint_discriminator': ('seq_len', 'num_features'),
+}
+
+# Architecture JSON per (kind, sizes), filled by the first build of each architecture
+_ARCHITECTURE_CACHE = {}
+
+
+class LazyModel:
+    def __init__(self, build):
+        """Defers `build()` until the model is first called or one of its attributes is used."""
+        self._build = build
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._build()
+        return self._model
+
+    @property
+    def built(self):
+        return self._model is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.model(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def build_model(kind, latent_dim=None, seq_len=None, num_features=NUM_FEATURES, verbose=False, lazy=False,
+                weights_path=None):
+    """Builds a PianoGAN model by kind ('generator', 'discriminator', 'joint_generator', 'joint_discriminator').
+
+    Every kind takes the same size keywords and uses the ones listed in
+    `MODEL_SIZES`; the others are ignored. The per-feature discriminator's
+    input length is `seq_len`. A size the kind uses must not be None.
+
+    The first build of an architecture runs its builder and caches the model's
+    JSON config; later silent builds recreate the model from that config.
+    `weights_path` loads saved weights. With `lazy=True` a `LazyModel` is
+    returned and nothing is built until first use. The construction time in
+    seconds is stored on the model as `construction_seconds`.
+    """
+    if kind not in MODEL_BUILDERS:
+        raise ValueError(f'unknown model kind {kind!r}, expected one of {sorted(MODEL_BUILDERS)}')
+    given = {'latent_dim': latent_dim, 'seq_len': seq_len, 'num_features': num_features}
+    sizes = tuple(given[name] for name in MODEL_SIZES[kind])
+    missing = [name for name, size in zip(MODEL_SIZES[kind], sizes) if size is None]
+    if missing:
+        raise ValueError(f'{kind} needs {", ".join(missing)}')
+    if lazy:
+        return LazyModel(functools.partial(build_model, kind, latent_dim, seq_len, num_features, verbose=verbose,
+                                           weights_path=weights_path))
+
+    start_time = time.perf_counter()
+    key = (kind, sizes)
+    if key in _ARCHITECTURE_CACHE and not verbose:
+        model = tf.keras.models.model_from_json(_ARCHITECTURE_CACHE[key])
+    else:
+        model = MODEL_BUILDERS[kind](*sizes, verbose=verbose)
+        _ARCHITECTURE_CACHE[key] = model.to_json()
+    if weights_path is not None:
+        model.load_weights(weights_path)
+    model.construction_seconds = time.perf_counter() - start_time
+    return model
+
+
+def benchmark_model_construction(latent_dim=256, seq_len=256, repeats=5):
+    """Prints the mean construction time of each way of getting a PianoGAN model.
+
+    The per-feature builders are timed verbose and silent, since they print every
+    layer. The joint generator is timed from its builder and from the cached
+    config. 'lazy create' only creates a `LazyModel`; 'lazy first call' also
+    makes the first call through it, which builds the model and runs one forward
+    pass.
+
+    Returns the mean milliseconds per variant.
+    """
+    latent = tf.random.normal((1, latent_dim))
+
+    def lazy_first_call():
+        model = build_model('joint_generator', latent_dim, seq_len, lazy=True)
+        model(latent, training=False)
+
+    variants = {
+        'generator verbose': lambda: build_generator(latent_dim, seq_len, verbose=True),
+        'generator silent': lambda: build_generator(latent_dim, seq_len),
+        'discriminator verbose': lambda: build_discriminator(seq_len, verbose=True),
+        'discriminator silent': lambda: build_discriminator(seq_len),
+        'joint builder': lambda: build_joint_generator(latent_dim, seq_len),
+        'joint cached': lambda: build_model('joint_generator', latent_dim, seq_len),
+        'lazy create': lambda: build_model('joint_generator', latent_dim, seq_len, lazy=True),
+        'lazy first call': lazy_first_call,
+    }
+    # Fill the architecture cache so 'joint cached' and 'lazy first call' rebuild from the config
+    build_model('joint_generator', latent_dim, seq_len)
+    report = {}
+    for name, build in variants.items():
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            build()
+        report[name] = 1000 * (time.perf_counter() - start_time) / repeats
+    for name, ms in report.items():
+        print(f"{name:>21}: {ms:8.2f} ms")
+    return report
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Array-native note extraction for PianoGAN.
+
+Notes are extracted as NumPy structured arrays with the fields `pitch`, `start`,
+`end`, `step` and `duration`, computed with whole-array operations. Parsed files
+are cached on disk as one compressed `.npz` per MIDI file, keyed by the hash of
+the file contents, so re-runs skip MIDI parsing entirely. pretty_midi and pandas
+are imported only by the functions that parse MIDI or build DataFrames.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+NOTE_DTYPE = np.dtype([
+    ('pitch', np.int16),
+    ('start', np.float64),
+    ('end', np.float64),
+    ('step', np.float64),
+    ('duration', np.float64),
+])
+
+# Bump when the extraction changes, so stale cache entries are not reused
+CACHE_VERSION = 1
+
+
+class MidiFormatError(ValueError):
+    """Raised for MIDI files that do not hold a single, non-empty piano track."""
+
+
+def instrument_to_notes(instrument: 'pretty_midi.Instrument') -> np.ndarray:
+    """Returns the notes of an instrument as a structured array sorted by start time."""
+    raw = np.fromiter(((note.pitch, note.start, note.end) for note in instrument.notes),
+                      dtype=[('pitch', np.int16), ('start', np.float64), ('end', np.float64)],
+                      count=len(instrument.notes))
+
+    # Sort the notes by start time
+    raw = raw[np.argsort(raw['start'], kind='stable')]
+
+    notes = np.empty(len(raw), dtype=NOTE_DTYPE)
+    notes['pitch'] = raw['pitch']
+    notes['start'] = raw['start']
+    notes['end'] = raw['end']
+    notes['step'] = np.diff(raw['start'], prepend=raw['start'][:1])
+    notes['duration'] = raw['end'] - raw['start']
+    return notes
+
+
+def midi_to_note_array(midi_file: str) -> np.ndarray:
+    """Returns the notes of the single instrument of a MIDI file as a structured array."""
+    import pretty_midi
+
+    pm = pretty_midi.PrettyMIDI(midi_file)
+    if len(pm.instruments) != 1:
+        raise MidiFormatError(f'expected 1 instrument, found {len(pm.instruments)}')
+    if not pm.instruments[0].notes:
+        raise MidiFormatError('instrument has no notes')
+    return instrument_to_notes(pm.instruments[0])
+
+
+def notes_to_frame(notes: np.ndarray) -> 'pd.DataFrame':
+    """Returns a structured note array as a DataFrame with one column per field."""
+    import pandas as pd
+
+    return pd.DataFrame({name: notes[name] for name in NOTE_DTYPE.names})
+
+
+def file_digest(path: str) -> str:
+    """Returns the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_notes_cached(midi_file: str, cache_dir: str) -> np.ndarray:
+    """Returns the note array of a MIDI file, parsing it only on a cache miss."""
+    cache_path = os.path.join(cache_dir, f'{file_digest(midi_file)}-v{CACHE_VERSION}.npz')
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            return cached['notes']
+
+    notes = midi_to_note_array(midi_file)
+
+    # Write to a temporary file first so concurrent or interrupted runs never leave a partial entry
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp.npz'
+    np.savez_compressed(tmp_path, notes=notes)
+    os.replace(tmp_path, cache_path)
+    return notes
+
+
+def load_corpus(filenames, cache_dir: str) -> np.ndarray:
+    """Returns the concatenated note arrays of several MIDI files."""
+    return np.concatenate([load_notes_cached(f, cache_dir) for f in filenames])
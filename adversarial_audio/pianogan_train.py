@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Compiled adversarial training step for PianoGAN.
+
+The discriminator and generator updates of one step run inside a single
+`tf.function` with `GradientTape`, so a step is one graph dispatch with noise and
+labels created on device, instead of a `predict` plus three `train_on_batch`
+calls with NumPy labels allocated on the host every iteration. Noise is drawn
+from the global `tf.random.Generator`, whose state is checkpointable.
+"""
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+
+def wasserstein_loss(y_true, y_pred):
+    return tf.reduce_mean(y_true * y_pred)
+
+
+def make_train_step(generator, discriminator, generator_optimizer, discriminator_optimizer,
+                    latent_dim, loss_fn=wasserstein_loss):
+    """Returns a compiled step `train_step(real_data) -> (d_loss, g_loss)`.
+
+    The losses and labels match the Keras loop: the discriminator sees real data
+    labelled 1 and generated data labelled 0 and its loss is the mean of both,
+    then the generator is updated to have its samples labelled 1.
+    """
+
+    rng = tf.random.get_global_generator()
+
+    @tf.function
+    def train_step(real_data):
+        batch_size = tf.shape(real_data)[0]
+        real_labels = tf.ones((batch_size, 1))
+        fake_labels = tf.zeros((batch_size, 1))
+
+        # Train the discriminator on real data and on samples from the current generator
+        fake_data = generator(rng.normal((batch_size, latent_dim)), training=False)
+        with tf.GradientTape() as tape:
+            d_loss_real = loss_fn(real_labels, discriminator(real_data, training=True))
+            d_loss_fake = loss_fn(fake_labels, discriminator(fake_data, training=True))
+            d_loss = 0.5 * (d_loss_real + d_loss_fake)
+        gradients = tape.gradient(d_loss, discriminator.trainable_variables)
+        discriminator_optimizer.apply_gradients(zip(gradients, discriminator.trainable_variables))
+
+        # Train the generator through the discriminator
+        noise = rng.normal((batch_size, latent_dim))
+        with tf.GradientTape() as tape:
+            g_loss = loss_fn(real_labels, discriminator(generator(noise, training=True), training=True))
+        gradients = tape.gradient(g_loss, generator.trainable_variables)
+        generator_optimizer.apply_gradients(zip(gradients, generator.trainable_variables))
+
+        return d_loss, g_loss
+
+    return train_step
+
+
+def legacy_train_step(generator, discriminator, gan, real_data, latent_dim):
+    """One step of the original Keras loop: `predict` plus three `train_on_batch` calls."""
+    batch_size = len(real_data)
+    fake_data = generator.predict(np.random.randn(batch_size, latent_dim), verbose=0)
+    d_loss_real = discriminator.train_on_batch(real_data, np.ones((batch_size, 1)))
+    d_loss_fake = discriminator.train_on_batch(fake_data, np.zeros((batch_size, 1)))
+    g_loss = gan.train_on_batch(np.random.randn(batch_size, latent_dim), np.ones((batch_size, 1)))
+    return 0.5 * np.add(d_loss_real, d_loss_fake), g_loss
+
+
+def benchmark_train_steps(generator, discriminator, gan, real_data, latent_dim, steps=50, device='/CPU:0'):
+    """Prints steps/sec of the legacy Keras loop and the compiled step on `device`.
+
+    Both variants update the models' weights, so run this on throwaway models.
+    """
+    report = {}
+    with tf.device(device):
+        train_step = make_train_step(generator, discriminator, gan.optimizer, discriminator.optimizer, latent_dim)
+        variants = {
+            'legacy': lambda: legacy_train_step(generator, discriminator, gan, real_data, latent_dim),
+            'compiled': lambda: [loss.numpy() for loss in train_step(real_data)],
+        }
+        for name, step in variants.items():
+            # The first call pays for tracing / building the Keras train functions
+            step()
+            start_time = time.perf_counter()
+            for _ in range(steps):
+                step()
+            elapsed = time.perf_counter() - start_time
+            report[name] = steps / elapsed
+            print(f"{name:>8}: {report[name]:8.2f} steps/sec")
+    return report
+
+
+def train(train_step, dataset, epochs, steps_per_epoch=None, log_every=1, on_epoch_end=None, checkpoint=None,
+          checkpoint_every=1, metrics=None):
+    """Trains for `epochs` full passes over `dataset` through one long-lived iterator.
+
+    `dataset` yields (real_data, labels) batches and should reshuffle on each
+    iteration, e.g. `create_training_dataset`; it is repeated so the iterator and
+    its prefetch buffer are set up once, and `steps_per_epoch` defaults to the
+    dataset's cardinality. `on_epoch_end(epoch, history)` is called after every
+    epoch. Returns the history: per-epoch mean losses, the iterator setup time
+    and the per-epoch mean and max input latency (time spent waiting in
+    `next`), in seconds.
+
+    With a `TrainingCheckpoint`, training resumes from its latest checkpoint
+    (including the iterator position) and the full state is saved every
+    `checkpoint_every` epochs.
+
+    With a `MetricsLogger`, every step's losses, data-wait time, step time and
+    samples/sec are appended to its log once per epoch; the log is reset first
+    unless training resumes from a checkpoint. The discriminator and
+    generator updates run in one compiled graph, so the step time is not split
+    into forward and backward.
+    """
+    if steps_per_epoch is None:
+        steps_per_epoch = int(dataset.cardinality())
+        if steps_per_epoch <= 0:
+            raise ValueError('dataset cardinality is unknown or infinite; pass steps_per_epoch')
+
+    start_time = time.perf_counter()
+    iterator = iter(dataset.repeat())
+    history = {'d_loss': [], 'g_loss': [], 'input_latency': [], 'input_latency_max': [],
+               'iterator_setup_seconds': time.perf_counter() - start_time}
+
+    start_epoch, step = 0, 0
+    if checkpoint is not None:
+        checkpoint.track_iterator(iterator)
+        start_epoch, step, restored_history = checkpoint.restore()
+        if restored_history is not None:
+            history.update({key: restored_history.get(key, [])
+                            for key in ('d_loss', 'g_loss', 'input_latency', 'input_latency_max')})
+            print(f"Resuming from epoch {start_epoch}, step {step}")
+    if metrics is not None and step == 0:
+        metrics.reset()
+
+    for epoch in range(start_epoch, epochs):
+        d_losses, g_losses, latencies, step_times, batch_sizes = [], [], [], [], []
+        for _ in range(steps_per_epoch):
+            start_time = time.perf_counter()
+            real_data, _ = next(iterator)
+            latencies.append(time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            d_loss, g_loss = train_step(real_data)
+            step_times.append(time.perf_counter() - start_time)
+            batch_sizes.append(real_data.shape[0])
+            d_losses.append(d_loss)
+            g_losses.append(g_loss)
+            step += 1
+
+        # Reduce on device and read the losses back once per epoch
+        history['d_loss'].append(float(tf.reduce_mean(tf.stack(d_losses))))
+        history['g_loss'].append(float(tf.reduce_mean(tf.stack(g_losses))))
+        # Only per-epoch aggregates are kept, so the history stays small over long runs
+        history['input_latency'].append(sum(latencies) / len(latencies))
+        history['input_latency_max'].append(max(latencies))
+
+        if metrics is not None:
+            first_step = step - steps_per_epoch + 1
+            for i, (d_loss, g_loss) in enumerate(zip(tf.stack(d_losses).numpy(), tf.stack(g_losses).numpy())):
+                metrics.log(epoch=epoch, step=first_step + i, d_loss=float(d_loss), g_loss=float(g_loss),
+                            data_wait_ms=1000 * latencies[i], step_ms=1000 * step_times[i],
+                            samples_per_sec=batch_sizes[i] / max(latencies[i] + step_times[i], 1e-9))
+            metrics.flush()
+
+        if epoch % log_every == 0:
+            print(f"Epoch {epoch}, D Loss: {history['d_loss'][-1]}, G Loss: {history['g_loss'][-1]}, "
+                  f"input latency: {1000 * history['input_latency'][-1]:.2f} ms/step "
+                  f"(max {1000 * history['input_latency_max'][-1]:.2f} ms)")
+        if on_epoch_end is not None:
+            on_epoch_end(epoch, history)
+        if checkpoint is not None and ((epoch + 1) % checkpoint_every == 0 or epoch + 1 == epochs):
+            checkpoint.save(epoch + 1, step, history)
+
+    if checkpoint is not None:
+        checkpoint.wait()
+    return history
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Fused sliding-window datasets for PianoGAN.
+
+All three note features are windowed together from a single (N, 3) note matrix.
+Windows are built by gathering `start + arange(seq_length + 1)` rows, so the
+corpus is held once as an (N, 3) tensor instead of being re-windowed per feature
+with `window` + `flat_map`. The per-feature datasets are projections of it.
+"""
+
+import multiprocessing
+import queue
+import resource
+import time
+
+import numpy as np
+import tensorflow as tf
+
+KEY_ORDER = ('pitch', 'step', 'duration')
+
+
+def notes_to_matrix(notes, vocab_size=128) -> np.ndarray:
+    """Returns an (N, 3) float32 matrix of pitch/step/duration with pitch scaled by `vocab_size`."""
+    matrix = np.stack([np.asarray(notes[key], dtype=np.float32) for key in KEY_ORDER], axis=1)
+    # Normalize note pitch
+    matrix[:, 0] /= vocab_size
+    return matrix
+
+
+def create_note_sequences(notes_matrix: np.ndarray, seq_length: int) -> tf.data.Dataset:
+    """Returns TF Dataset of (seq_length, 3) note sequences and their (3,) label notes."""
+    n_windows = len(notes_matrix) - seq_length
+    matrix = tf.constant(notes_matrix)
+    # Take 1 extra for the labels
+    offsets = tf.range(seq_length + 1, dtype=tf.int64)
+
+    def gather_window(start):
+        window = tf.gather(matrix, start + offsets)
+        return window[:-1], window[-1]
+
+    return tf.data.Dataset.range(n_windows).map(gather_window, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def project_feature(sequences: tf.data.Dataset, feature: str) -> tf.data.Dataset:
+    """Returns TF Dataset of (seq_length,) sequences and scalar labels for a single feature."""
+    i = KEY_ORDER.index(feature)
+    return sequences.map(lambda inputs, labels: (inputs[:, i], labels[i]),
+                         num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def create_training_dataset(
+    notes_matrix: np.ndarray,
+    seq_length: int,
+    batch_size: int,
+    feature=None,
+    shuffle=True,
+    seed=None,
+) -> tf.data.Dataset:
+    """Returns TF Dataset of batched note windows, reshuffled every epoch with bounded memory.
+
+    Only window start indices are shuffled (8 bytes per window instead of a whole
+    window), the note matrix itself is held once, and each batch of windows is
+    gathered in a single op after batching. If `feature` is given the batches
+    are projected onto that feature.
+    """
+    n_windows = len(notes_matrix) - seq_length
+    matrix = tf.constant(notes_matrix)
+    offsets = tf.range(seq_length + 1, dtype=tf.int64)
+
+    starts = tf.data.Dataset.range(n_windows)
+    if shuffle:
+        starts = starts.shuffle(n_windows, seed=seed, reshuffle_each_iteration=True)
+
+    def gather_batch(batch_starts):
+        windows = tf.gather(matrix, batch_starts[:, tf.newaxis] + offsets)
+        inputs, labels = windows[:, :-1], windows[:, -1]
+        if feature is not None:
+            i = KEY_ORDER.index(feature)
+            return inputs[:, :, i], labels[:, i]
+        return inputs, labels
+
+    return (starts
+            .batch(batch_size, drop_remainder=True)
+            .map(gather_batch, num_parallel_calls=tf.data.AUTOTUNE)
+            .prefetch(tf.data.AUTOTUNE))
+
+
+def _legacy_training_dataset(notes_matrix, seq_length, batch_size, feature='pitch'):
+    """Returns the original window/flat_map -> shuffle -> batch -> cache chain, for benchmarking."""
+    values = notes_matrix[:, KEY_ORDER.index(feature)]
+    windows = tf.data.Dataset.from_tensor_slices(values).window(seq_length + 1, shift=1, stride=1,
+                                                                  drop_remainder=True)
+    sequences = windows.flat_map(lambda x: x.batch(seq_length + 1, drop_remainder=True))
+    sequences = sequences.map(lambda x: (x[:-1], x[-1]), num_parallel_calls=tf.data.AUTOTUNE)
+    return (sequences
+            .shuffle(len(values) - seq_length)
+            .batch(batch_size, drop_remainder=True)
+            .cache()
+            .prefetch(tf.data.AUTOTUNE))
+
+
+def _run_pipeline_benchmark(kind, notes_matrix, seq_length, batch_size, epochs, results):
+    """Benchmark worker: iterates one pipeline and reports steps/sec and peak RSS."""
+    if kind == 'legacy':
+        dataset = _legacy_training_dataset(notes_matrix, seq_length, batch_size)
+    else:
+        dataset = create_training_dataset(notes_matrix, seq_length, batch_size, feature='pitch')
+
+    steps = 0
+    start_time = time.perf_counter()
+    for _ in range(epochs):
+        for _ in dataset:
+            steps += 1
+    elapsed = time.perf_counter() - start_time
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put((kind, steps / max(elapsed, 1e-9), peak_mb))
+
+
+def benchmark_input_pipelines(notes_matrix, seq_length=256, batch_size=256, epochs=2, timeout=600):
+    """Prints steps/sec and peak memory of the legacy and reworked pitch pipelines.
+
+    Each pipeline runs in a fresh process so the peak RSS figures are independent.
+    A process that dies or runs longer than `timeout` seconds is reported with
+    an 'error' entry instead of a measurement.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    report = {}
+    for kind in ('legacy', 'indexed'):
+        process = context.Process(target=_run_pipeline_benchmark,
+                                  args=(kind, notes_matrix, seq_length, batch_size, epochs, results))
+        process.start()
+        deadline = time.monotonic() + timeout
+        result, error = None, None
+        while result is None and error is None:
+            # Checked before waiting, so a result put just before the worker exited is still read
+            alive = process.is_alive()
+            try:
+                result = results.get(timeout=1)
+            except queue.Empty:
+                if not alive:
+                    error = f'worker exited with code {process.exitcode}'
+                elif time.monotonic() > deadline:
+                    process.terminate()
+                    error = f'timed out after {timeout}s'
+        process.join()
+        if error is not None:
+            report[kind] = {'error': error}
+            print(f"{kind:>8}: failed, {error}")
+            continue
+        name, steps_per_sec, peak_mb = result
+        report[name] = {'steps_per_sec': steps_per_sec, 'peak_rss_mb': peak_mb}
+        print(f"{name:>8}: {steps_per_sec:8.1f} steps/sec, peak RSS {peak_mb:8.1f} MB")
+    return report
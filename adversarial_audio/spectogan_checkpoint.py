@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Asynchronous, resumable training checkpoints for SpectoGAN.
+
+A checkpoint holds both models, both optimizers, the gradient scaler, every RNG
+state, the epoch/step counters and the metric history. The state is copied to
+the CPU on the training thread, then serialized by a background thread to a
+temporary file that is atomically renamed, so a crash never leaves a truncated
+checkpoint behind. Only the last `keep_last` checkpoints are kept.
+"""
+
+import copy
+import glob
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+
+def _to_cpu(state):
+    """
+    Copy a nested state (dicts, lists, tuples, tensors) so that later in-place updates do not change it.
+    """
+    if torch.is_tensor(state):
+        return state.detach().to('cpu', copy=True)
+    if isinstance(state, dict):
+        return {key: _to_cpu(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(_to_cpu(value) for value in state)
+    return copy.deepcopy(state)
+
+
+def rng_state():
+    """
+    Snapshot of the Python, NumPy, torch CPU and CUDA random number generator states.
+    """
+    return {'python': random.getstate(),
+            'numpy': np.random.get_state(),
+            'torch': torch.get_rng_state(),
+            'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else []}
+
+
+def set_rng_state(state):
+    """
+    Restore a snapshot taken by `rng_state`.
+    """
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if state['cuda'] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def training_state(D, G, optimizerd, optimizerg, epoch, step, history, scaler=None):
+    """
+    Everything needed to resume training after `epoch` completed epochs.
+    """
+    return {'discriminator': D.state_dict(),
+            'generator': G.state_dict(),
+            'optimizerd': optimizerd.state_dict(),
+            'optimizerg': optimizerg.state_dict(),
+            'scaler': scaler.state_dict() if scaler is not None else None,
+            'rng': rng_state(),
+            'epoch': epoch,
+            'step': step,
+            'history': history}
+
+
+def restore_training_state(state, D, G, optimizerd, optimizerg, scaler=None):
+    """
+    Load a checkpoint written from `training_state` into the models and optimizers.
+
+    Returns:
+    - tuple: The number of completed epochs, the step counter and the metric history.
+    """
+    D.load_state_dict(state['discriminator'])
+    G.load_state_dict(state['generator'])
+    optimizerd.load_state_dict(state['optimizerd'])
+    optimizerg.load_state_dict(state['optimizerg'])
+    if scaler is not None and state['scaler'] is not None:
+        scaler.load_state_dict(state['scaler'])
+    set_rng_state(state['rng'])
+    return state['epoch'], state['step'], state['history']
+
+
+class CheckpointManager:
+    def __init__(self, directory, keep_last=3, prefix='checkpoint'):
+        """
+        Initialize the CheckpointManager.
+        Parameters:
+        - directory (str): Directory the checkpoints are written to.
+        - keep_last (int): Number of most recent checkpoints kept on disk.
+        - prefix (str): File name prefix; files are named `<prefix>_<step>.pt`.
+        """
+        if keep_last < 1:
+            raise ValueError(f'keep_last must be at least 1, got {keep_last}')
+        self.directory = directory
+        self.keep_last = keep_last
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+        # A single writer thread keeps saves ordered; at most one save is in flight at a time
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = None
+
+    def checkpoints(self):
+        """
+        Paths of the complete checkpoints on disk, oldest first.
+        """
+        pattern = re.compile(re.escape(self.prefix) + r'_(\d+)\.pt$')
+        paths = [path for path in glob.glob(os.path.join(self.directory, self.prefix + '_*.pt'))
+                 if pattern.search(path)]
+        return sorted(paths, key=lambda path: int(pattern.search(path).group(1)))
+
+    def _write(self, step, state):
+        path = os.path.join(self.directory, f'{self.prefix}_{step:09d}.pt')
+        tmp_path = path + '.tmp'
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+        for old_path in self.checkpoints()[:-self.keep_last]:
+            os.remove(old_path)
+        return path
+
+    def save(self, step, state):
+        """
+        Save a checkpoint in the background.
+
+        The state is copied to the CPU before returning, so training can continue
+        to update the models while the copy is serialized.
+        """
+        snapshot = _to_cpu(state)
+        self.wait()
+        self._pending = self._executor.submit(self._write, step, snapshot)
+
+    def wait(self):
+        """
+        Block until the pending save is on disk; re-raises its error if it failed.
+        """
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            return pending.result()
+
+    def load_latest(self, map_location='cpu'):
+        """
+        The most recent checkpoint, or None if there is none yet.
+        """
+        self.wait()
+        paths = self.checkpoints()
+        if not paths:
+            return None
+        # The checkpoint holds RNG states (tuples and NumPy arrays), not only tensors
+        return torch.load(paths[-1], map_location=map_location, weights_only=False)
+
+    def close(self):
+        """
+        Wait for the pending save and stop the writer thread.
+        """
+        self.wait()
+        self._executor.shutdown()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Generator and Discriminator models for SpectoGAN.
+
+The default configuration is the 3x256x256 RGB image GAN; `channels=1` with the
+native `image_size=(n_mels, frames)` trains directly on log-mel tensors.
+Both models support an opt-in execution mode: bfloat16/float16 autocast and the
+`channels_last` memory format, which speed up the convolutions on CPU and on
+tensor-core GPUs. `check_parity` compares a mode's outputs against float32.
+"""
+
+import contextlib
+import copy
+
+import torch
+import torch.nn as nn
+
+# Autocast dtype of each precision mode
+PRECISIONS = {'fp32': None, 'bf16': torch.bfloat16, 'fp16': torch.float16}
+
+
+class Generator(nn.Module):
+    def __init__(self, latent_size, channels=3, image_size=(256, 256)):
+        """
+        Initialize the Generator module.
+        Parameters:
+        - latent_size (int): Size of the latent noise vector.
+        - channels (int): Number of output channels; 3 for RGB images, 1 for native log-mel tensors.
+        - image_size (tuple): Output (height, width); both must be divisible by 2 ** (log2(min side) - 2).
+        """
+        super(Generator, self).__init__()
+
+        # Each stride-2 ConvTranspose layer doubles the resolution, starting from min side 4:
+        # 6 layers from 4x4 for the 256x256 RGB images, 3 layers from 16x4 for 128x32 log-mels
+        height, width = image_size
+        num_upsamples = (min(height, width) // 4).bit_length() - 1
+        widths = [1024 // 2 ** i for i in range(num_upsamples)]
+        initial_size = (height // 2 ** num_upsamples, width // 2 ** num_upsamples)
+
+        # Define the layers for the generator
+        layers = [nn.ConvTranspose2d(in_channels=latent_size, out_channels=widths[0], kernel_size=initial_size,
+                                     stride=1, padding=0),
+                  nn.BatchNorm2d(widths[0]),
+                  nn.ReLU()]
+        for in_width, out_width in zip(widths, widths[1:]):
+            layers += [nn.ConvTranspose2d(in_channels=in_width, out_channels=out_width, kernel_size=4, stride=2, padding=1),
+                       nn.BatchNorm2d(out_width),
+                       nn.ReLU()]
+        layers += [nn.ConvTranspose2d(in_channels=widths[-1], out_channels=channels, kernel_size=4, stride=2, padding=1),
+                   nn.Tanh()]
+        self.main = nn.Sequential(*layers)
+
+    def forward(self, x):
+        """
+        Forward pass through the generator.
+        """
+        # Outputting a channels x height x width image
+        x = self.main(x)
+        return x
+
+
+class Discriminator(nn.Module):
+    def __init__(self, logits=False, channels=3, image_size=(256, 256)):
+        """
+        Initialize the Discriminator module.
+        Parameters:
+        - logits (bool): Output raw logits instead of sigmoid probabilities, for the fused BCE-with-logits loss.
+        - channels (int): Number of input channels; 3 for RGB images, 1 for native log-mel tensors.
+        - image_size (tuple): Input (height, width).
+        """
+        super(Discriminator, self).__init__()
+
+        # Each stride-2 Conv layer halves the resolution down to min side 8 before the final
+        # 4x4 conv: 5 layers for the 256x256 RGB images, 2 layers for 128x32 log-mels
+        num_downsamples = (min(image_size) // 8).bit_length() - 1
+        widths = [channels] + [64 * 2 ** i for i in range(num_downsamples)]
+
+        # Define the layers for the discriminator
+        layers = []
+        for in_width, out_width in zip(widths, widths[1:]):
+            layers += [nn.Conv2d(in_channels=in_width, out_channels=out_width, kernel_size=4, stride=2, padding=1),
+                       nn.BatchNorm2d(out_width),
+                       nn.LeakyReLU(0.2, inplace=True)]
+        layers += [nn.Conv2d(in_channels=widths[-1], out_channels=1, kernel_size=4, stride=2, padding=0),
+                   nn.Flatten(),
+                   nn.Identity() if logits else nn.Sigmoid()]
+        self.main = nn.Sequential(*layers)
+
+    def forward(self, x):
+        """
+        Forward pass through the discriminator.
+        """
+        x = self.main(x)
+        return x
+
+
+def set_memory_format(model, channels_last):
+    """
+    Convert a model's parameters to the channels_last (NHWC) or contiguous (NCHW) memory format, in place.
+    """
+    return model.to(memory_format=torch.channels_last if channels_last else torch.contiguous_format)
+
+
+def autocast(device, precision):
+    """
+    Autocast context for a precision mode; a no-op for fp32.
+    """
+    dtype = PRECISIONS[precision]
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=torch.device(device).type, dtype=dtype)
+
+
+def check_parity(model, inputs, precision, channels_last=False):
+    """
+    Compare a model's outputs in a precision/layout mode against float32 NCHW.
+
+    Parameters:
+    - model (nn.Module): Model to check; it is copied and evaluated in eval mode.
+    - inputs (torch.Tensor): Input batch.
+    - precision (str): One of `PRECISIONS`.
+    - channels_last (bool): Use the channels_last memory format.
+
+    Returns:
+    - float: Maximum absolute difference between the two outputs.
+    """
+    reference_model = copy.deepcopy(model).eval()
+    mode_model = set_memory_format(copy.deepcopy(model).eval(), channels_last)
+    mode_inputs = inputs.contiguous(memory_format=torch.channels_last) if channels_last else inputs
+    with torch.no_grad():
+        reference = reference_model(inputs).float()
+        with autocast(inputs.device, precision):
+            outputs = mode_model(mode_inputs)
+    return (outputs.float() - reference).abs().max().item()
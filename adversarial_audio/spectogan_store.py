@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Memory-mapped spectrogram tensor store for SpectoGAN.
+
+A store is a pair of files: `<name>.dat`, one contiguous array holding every
+already-normalized tensor back to back, and `<name>.json`, the index describing
+its shape, dtype and the source of each item. Packing is done once; afterwards
+`MemmapSpectrogramDataset` serves zero-copy views so DataLoader workers no longer
+decode, resize or normalize images on every access.
+
+`LogMelDataset` is the source dataset of the native representation: it serves
+`.npy` log-mel arrays as normalized 1 x n_mels x frames tensors.
+
+`make_dataloader` builds the training loader: a persistent worker pool sized to
+the available cores, a deeper prefetch queue, pinned host memory, and batches
+gathered straight into one preallocated tensor instead of stacking per-sample
+tensors.
+"""
+
+import json
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset, get_worker_info
+
+from .spectogan_features import N_FRAMES, fix_frames, normalize_db
+
+
+def _store_paths(store_path):
+    return store_path + '.dat', store_path + '.json'
+
+
+def pack_dataset(dataset, store_path, dtype='float16', names=None, verbose=True, batch_transform=None,
+                 batch_size=64):
+    """
+    Pack every tensor of a dataset into a memory-mapped store.
+
+    Parameters:
+    - dataset (Dataset): Source dataset returning equally shaped tensors, e.g. an `ImageDataset` with its transform.
+    - store_path (str): Path prefix of the store; `.dat` and `.json` are appended.
+    - dtype (str): Storage dtype, `float16` or `float32`.
+    - names (list, optional): Identifier stored in the index for each item (e.g. the source file paths).
+    - verbose (bool): Print packing progress.
+    - batch_transform (BatchTransform, optional): Applied to every `batch_size` items at once; the dataset
+      then returns uint8 images, which may differ in size.
+    - batch_size (int): Items per `batch_transform` call.
+
+    Returns:
+    - str: The store path prefix.
+    """
+    data_path, index_path = _store_paths(store_path)
+    directory = os.path.dirname(store_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    count = len(dataset)
+    if batch_transform is not None:
+        item_shape = tuple(batch_transform([dataset[0]]).shape[1:])
+        data = np.memmap(data_path, dtype=dtype, mode='w+', shape=(count,) + item_shape)
+        for start in range(0, count, batch_size):
+            end = min(start + batch_size, count)
+            data[start:end] = batch_transform([dataset[i] for i in range(start, end)]).cpu().numpy()
+            if verbose:
+                print(f"\rPacked: {end}/{count}", end='')
+    else:
+        item_shape = tuple(np.asarray(dataset[0]).shape)
+        data = np.memmap(data_path, dtype=dtype, mode='w+', shape=(count,) + item_shape)
+        for i in range(count):
+            data[i] = np.asarray(dataset[i], dtype=dtype)
+            if verbose and (i + 1) % 500 == 0:
+                print(f"\rPacked: {i + 1}/{count}", end='')
+    data.flush()
+    del data
+
+    index = {"count": count,
+             "shape": list(item_shape),
+             "dtype": np.dtype(dtype).name,
+             "names": list(names) if names is not None else None}
+    # Write the index last and atomically, so a complete index always describes complete data
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+    if verbose:
+        print(f"\nPacked {count} tensors of shape {item_shape} into {data_path}")
+        if batch_transform is not None:
+            latency = batch_transform.latency_summary()
+            print(f"Batch transform: {latency['mean_ms']:.2f} ms mean, {latency['max_ms']:.2f} ms max "
+                  f"over {latency['batches']} batches")
+    return store_path
+
+
+class MemmapSpectrogramDataset(Dataset):
+    def __init__(self, store_path, transform=None):
+        """
+        Initialize the MemmapSpectrogramDataset.
+        Parameters:
+        - store_path (str): Path prefix of a store written by `pack_dataset`.
+        - transform (callable, optional): Optional transformation applied to each tensor.
+        """
+        self.data_path, index_path = _store_paths(store_path)
+        with open(index_path) as f:
+            self.index = json.load(f)
+        self.transform = transform
+        # The memmap is opened lazily so each DataLoader worker maps the file itself
+        # instead of pickling the array into the worker processes
+        self._data = None
+
+    @property
+    def data(self):
+        """
+        The packed array, mapped copy-on-write so views are writable without touching the file.
+        """
+        if self._data is None:
+            self._data = np.memmap(self.data_path, dtype=self.index["dtype"], mode='c',
+                                   shape=(self.index["count"],) + tuple(self.index["shape"]))
+        return self._data
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+
+    def __len__(self):
+        """
+        Get the number of tensors in the store.
+        """
+        return self.index["count"]
+
+    def __getitem__(self, index):
+        """
+        Get a zero-copy tensor view of one stored spectrogram.
+        """
+        tensor = torch.from_numpy(self.data[index])
+
+        # Apply the specified transformation if provided
+        if self.transform:
+            tensor = self.transform(tensor)
+
+        return tensor
+
+    def __getitems__(self, indices):
+        """
+        Get a whole batch, gathered from the memmap in one copy into a preallocated tensor.
+
+        The batch is returned as a `GatheredBatch`, a list of per-item views, so any collate
+        function accepts it; `collate_batch` returns the gathered tensor without copying.
+        """
+        if self.transform:
+            return [self[index] for index in indices]
+        batch = _batch_buffer((len(indices),) + tuple(self.index["shape"]), getattr(torch, self.index["dtype"]))
+        np.take(self.data, indices, axis=0, out=batch.numpy())
+        return GatheredBatch(batch)
+
+
+class LogMelDataset(Dataset):
+    def __init__(self, spectrogram_list, n_frames=N_FRAMES):
+        """
+        Initialize the LogMelDataset.
+        Parameters:
+        - spectrogram_list (list): List of file paths to the `.npy` log-mel arrays.
+        - n_frames (int): Number of frames every spectrogram is cropped or padded to.
+        """
+        self.spectrogram_list = spectrogram_list
+        self.n_frames = n_frames
+
+    def __len__(self):
+        """
+        Get the number of spectrograms in the dataset.
+        """
+        return len(self.spectrogram_list)
+
+    def __getitem__(self, index):
+        """
+        Get a 1 x n_mels x n_frames float32 tensor with the dB range normalized to [-1, 1].
+        """
+        log_spectrogram = fix_frames(np.load(self.spectrogram_list[index]), self.n_frames)
+        return torch.from_numpy(normalize_db(log_spectrogram).astype(np.float32)[np.newaxis])
+
+
+class GatheredBatch(list):
+    def __init__(self, tensor):
+        """
+        Per-item views of a batch tensor that a dataset gathered in one copy.
+        Parameters:
+        - tensor (torch.Tensor): The gathered (N, ...) batch, kept as `tensor`.
+        """
+        super().__init__(tensor.unbind(0))
+        self.tensor = tensor
+
+
+def _batch_buffer(shape, dtype):
+    """
+    Allocate a batch tensor; inside a DataLoader worker it lives in shared memory,
+    so handing it to the main process does not copy it again.
+    """
+    batch = torch.empty(shape, dtype=dtype)
+    if get_worker_info() is not None:
+        batch.share_memory_()
+    return batch
+
+
+def collate_batch(batch):
+    """
+    Collate samples into one preallocated batch tensor.
+
+    Batches that a dataset's `__getitems__` already gathered are passed through unchanged;
+    a list of equally shaped tensors is copied into a single buffer without an intermediate stack.
+    """
+    if isinstance(batch, GatheredBatch):
+        return batch.tensor
+    if isinstance(batch, torch.Tensor):
+        return batch
+    out = _batch_buffer((len(batch),) + tuple(batch[0].shape), batch[0].dtype)
+    for i, sample in enumerate(batch):
+        out[i].copy_(sample)
+    return out
+
+
+def default_num_workers(max_workers=8):
+    """
+    Number of DataLoader workers for this machine: the usable cores minus one for the training loop.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+    return max(0, min(max_workers, cores - 1))
+
+
+def make_dataloader(dataset, batch_size, shuffle=True, num_workers=None, pin_memory=None, prefetch_factor=4,
+                    persistent_workers=True, drop_last=False, seed=None):
+    """
+    Create a DataLoader tuned for feeding the GAN step.
+
+    Parameters:
+    - dataset (Dataset): Dataset of equally shaped tensors, e.g. a `MemmapSpectrogramDataset`.
+    - batch_size (int): Batch size.
+    - shuffle (bool): Reshuffle every epoch.
+    - num_workers (int, optional): Worker processes. Default is `default_num_workers()`; 0 loads on the training thread.
+    - pin_memory (bool, optional): Return batches in page-locked memory so `.to(device, non_blocking=True)`
+      overlaps the copy with compute. Default is whether CUDA is available.
+    - prefetch_factor (int): Batches each worker loads ahead.
+    - persistent_workers (bool): Keep the workers alive between epochs instead of restarting them.
+    - drop_last (bool): Drop the last incomplete batch.
+    - seed (int, optional): Seed of the shuffling order.
+
+    Returns:
+    - DataLoader: The configured loader.
+    """
+    if num_workers is None:
+        num_workers = default_num_workers()
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    generator = torch.Generator().manual_seed(seed) if seed is not None else None
+    worker_options = {'prefetch_factor': prefetch_factor, 'persistent_workers': persistent_workers} \
+        if num_workers > 0 else {}
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+                      collate_fn=collate_batch, pin_memory=pin_memory, drop_last=drop_last, generator=generator,
+                      **worker_options)
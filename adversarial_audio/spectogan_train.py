@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""Training step and loop for SpectoGAN.
+
+One generator pass per step is shared by both updates: the discriminator is
+trained on the detached fakes, so no `retain_graph` is needed, and the generator
+is trained through the updated discriminator on the same fakes. Losses and
+scores stay on the device and are read back only at logging intervals. An
+opt-in precision/layout mode runs the forward passes under bfloat16/float16
+autocast with channels_last tensors. With a `CheckpointManager`, the loop saves
+its full state in the background after every few epochs and resumes from the
+latest checkpoint automatically. With a `MetricsLogger`, every step's metrics
+and data-wait/forward/backward times are appended to a log, read back from the
+device in bulk at logging intervals. `profile_input_pipeline` splits step time
+into data wait and compute to show whether a DataLoader keeps the step fed.
+"""
+
+import copy
+import resource
+import time
+
+import torch
+import torch.optim as optim
+
+from .spectogan_checkpoint import restore_training_state, training_state
+from .spectogan_losses import LabelNoiseLoss
+from .spectogan_models import Discriminator, Generator, autocast, check_parity, set_memory_format
+
+METRIC_NAMES = ('loss_g', 'loss_d', 'real_score', 'fake_score')
+
+
+class StepTimer:
+    def __init__(self, device):
+        """
+        Initialize the StepTimer.
+        Parameters:
+        - device (torch.device): Training device; CUDA steps are timed with events, so marking never syncs.
+        """
+        self.cuda = torch.device(device).type == 'cuda'
+        self.marks = []
+
+    def mark(self):
+        """
+        Record a point in time on the training stream.
+        """
+        if self.cuda:
+            event = torch.cuda.Event(enable_timing=True)
+            event.record()
+            self.marks.append(event)
+        else:
+            self.marks.append(time.perf_counter())
+
+    def intervals_ms(self):
+        """
+        Milliseconds between consecutive marks; waits for the last CUDA event.
+        """
+        if self.cuda:
+            self.marks[-1].synchronize()
+            return [start.elapsed_time(end) for start, end in zip(self.marks, self.marks[1:])]
+        return [1000 * (end - start) for start, end in zip(self.marks, self.marks[1:])]
+
+
+def _backward_step(loss, optimizer, scaler):
+    """
+    Backpropagate a loss and step its optimizer, through the gradient scaler if one is used.
+    """
+    optimizer.zero_grad(set_to_none=True)
+    if scaler is None:
+        loss.backward()
+        optimizer.step()
+    else:
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+
+
+def train_step(D, G, real_images, optimizerd, optimizerg, criterion, latent_size, precision='fp32', scaler=None,
+               timer=None):
+    """
+    Run one discriminator and one generator update.
+
+    Parameters:
+    - D (nn.Module): Discriminator model.
+    - G (nn.Module): Generator model.
+    - real_images (torch.Tensor): Batch of real images on the training device.
+    - optimizerd (optim.Optimizer): Discriminator optimizer.
+    - optimizerg (optim.Optimizer): Generator optimizer.
+    - criterion (LabelNoiseLoss): Label-noise loss.
+    - latent_size (int): Size of the latent noise vector.
+    - precision (str): Autocast mode of the forward passes, one of 'fp32', 'bf16' or 'fp16'.
+    - scaler (GradScaler, optional): Loss scaler, needed for fp16 on CUDA.
+    - timer (StepTimer, optional): Marked around each forward and backward phase (five marks per step).
+
+    Returns:
+    - torch.Tensor: loss_g, loss_d, real_score and fake_score, detached and still on the device.
+    """
+    batch_size = real_images.shape[0]
+    device = real_images.device
+    if timer is not None:
+        timer.mark()
+
+    # Pass real images through discriminator; losses are always computed in float32
+    with autocast(device, precision):
+        D_out_real = D(real_images).float()
+
+    # Draw the label noise for the real, fake and generator losses of this step at once
+    label_noise = criterion.sample((3,) + tuple(D_out_real.shape))
+    real_loss = criterion.real_loss(D_out_real, label_noise[0])
+
+    # Generate fake images once; the discriminator update only sees them detached
+    noise = torch.randn(batch_size, latent_size, 1, 1, device=device)
+    with autocast(device, precision):
+        fake_images = G(noise)
+        D_out_fake = D(fake_images.detach()).float()
+    fake_loss = criterion.fake_loss(D_out_fake, label_noise[1])
+
+    # Update discriminator weights
+    loss_d = real_loss + fake_loss
+    if timer is not None:
+        timer.mark()
+    _backward_step(loss_d, optimizerd, scaler)
+    if timer is not None:
+        timer.mark()
+
+    # Try to fool the updated discriminator with the same fakes; G has not changed, so they are still valid
+    with autocast(device, precision):
+        D_out_fake2 = D(fake_images).float()
+    loss_g = criterion.real_loss(D_out_fake2, label_noise[2])
+
+    # Update generator weights
+    if timer is not None:
+        timer.mark()
+    _backward_step(loss_g, optimizerg, scaler)
+    if scaler is not None:
+        scaler.update()
+    if timer is not None:
+        timer.mark()
+
+    with torch.no_grad():
+        return torch.stack([loss_g, loss_d,
+                            criterion.scores(D_out_real).mean(), criterion.scores(D_out_fake).mean()]).detach()
+
+
+def make_scaler(device, precision):
+    """
+    Gradient scaler for a precision mode: only float16 on CUDA needs loss scaling.
+    """
+    if precision == 'fp16' and torch.device(device).type == 'cuda':
+        return torch.amp.GradScaler('cuda')
+    return None
+
+
+def _log_steps(metrics, pending):
+    """
+    Read buffered per-step metrics back from the device in one transfer and append them to the log.
+    """
+    values = torch.stack([step_metrics for _, _, step_metrics, _, _, _ in pending]).tolist()
+    for (epoch, step, _, data_wait, timer, batch_size), row in zip(pending, values):
+        forward_1, backward_d, forward_2, backward_g = timer.intervals_ms()
+        forward_ms, backward_ms = forward_1 + forward_2, backward_d + backward_g
+        step_seconds = data_wait + (forward_ms + backward_ms) / 1000
+        metrics.log(epoch=epoch, step=step, **dict(zip(METRIC_NAMES, row)),
+                    data_wait_ms=1000 * data_wait, forward_ms=forward_ms, backward_ms=backward_ms,
+                    samples_per_sec=batch_size / max(step_seconds, 1e-9))
+    pending.clear()
+
+
+def train(D, G, dataloader, optimizerd, optimizerg, criterion, epochs, latent_size, device, log_interval=50,
+          precision='fp32', channels_last=False, checkpoint=None, checkpoint_every=1, metrics=None):
+    """
+    Train the GAN model.
+
+    Parameters:
+    - D (nn.Module): Discriminator model.
+    - G (nn.Module): Generator model.
+    - dataloader (DataLoader): Loader of real images.
+    - optimizerd (optim.Optimizer): Discriminator optimizer.
+    - optimizerg (optim.Optimizer): Generator optimizer.
+    - criterion (LabelNoiseLoss): Label-noise loss.
+    - epochs (int): Number of training epochs.
+    - latent_size (int): Size of the latent noise vector.
+    - device (torch.device): Training device.
+    - log_interval (int): Number of batches between metric read-backs.
+    - precision (str): Autocast mode of the forward passes, one of 'fp32', 'bf16' or 'fp16'.
+    - channels_last (bool): Run both models and the batches in the channels_last memory format.
+    - checkpoint (CheckpointManager, optional): Resume from its latest checkpoint if there is one,
+      and save a checkpoint in the background every `checkpoint_every` epochs.
+    - checkpoint_every (int): Number of epochs between checkpoints.
+    - metrics (MetricsLogger, optional): Append per-step losses, scores, data-wait, forward/backward
+      times and samples/sec to this log; it is reset first unless training resumes from a checkpoint.
+
+    Returns:
+    - dict: Per-epoch mean of each metric in `METRIC_NAMES`.
+    """
+    history = {name: [] for name in METRIC_NAMES}
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    set_memory_format(D, channels_last)
+    set_memory_format(G, channels_last)
+    scaler = make_scaler(device, precision)
+
+    # Resume from the latest checkpoint: weights, optimizers, scaler, RNG states and history
+    start_epoch, step = 0, 0
+    if checkpoint is not None:
+        state = checkpoint.load_latest()
+        if state is not None:
+            start_epoch, step, history = restore_training_state(state, D, G, optimizerd, optimizerg, scaler)
+            print(f"Resuming from epoch {start_epoch}, step {step}")
+    if metrics is not None and step == 0:
+        metrics.reset()
+
+    pending = []
+    # Iterate over epochs
+    for epoch in range(start_epoch, epochs):
+        epoch_sums = torch.zeros(len(METRIC_NAMES), device=device)
+        batches = iter(dataloader)
+        # Iterate over batches in the dataloader
+        for j in range(1, len(dataloader) + 1):
+            wait_start = time.perf_counter()
+            real_images = next(batches)
+            data_wait = time.perf_counter() - wait_start
+
+            real_images = real_images.to(device, non_blocking=True).float().contiguous(memory_format=memory_format)
+            timer = StepTimer(device) if metrics is not None else None
+            step_metrics = train_step(D, G, real_images, optimizerd, optimizerg, criterion, latent_size,
+                                      precision, scaler, timer)
+            epoch_sums += step_metrics
+            step += 1
+            if metrics is not None:
+                pending.append((epoch, step, step_metrics, data_wait, timer, real_images.shape[0]))
+
+            # Reading the metrics back forces a device sync, so only do it at logging intervals
+            if j % log_interval == 0 or j == len(dataloader):
+                if pending:
+                    _log_steps(metrics, pending)
+                means = (epoch_sums / j).tolist()
+                print(f"\rProgress: {j}/{len(dataloader)}, " +
+                      ", ".join(f"{name}: {value:.4f}" for name, value in zip(METRIC_NAMES, means)), end='')
+
+        means = (epoch_sums / max(len(dataloader), 1)).tolist()
+        for name, value in zip(METRIC_NAMES, means):
+            history[name].append(value)
+
+        # Log training progress for the epoch
+        print("\nEpoch [{}/{}], loss_g: {:.4f}, loss_d: {:.4f}, real_score: {:.4f}, fake_score: {:.4f}".format(
+            epoch + 1, epochs, *means))
+
+        if metrics is not None:
+            metrics.flush()
+        if checkpoint is not None and ((epoch + 1) % checkpoint_every == 0 or epoch + 1 == epochs):
+            checkpoint.save(step, training_state(D, G, optimizerd, optimizerg, epoch + 1, step, history, scaler))
+
+    if checkpoint is not None:
+        checkpoint.wait()
+    return history
+
+
+def legacy_train_step(D, G, real_images, optimizerd, optimizerg, criterion, latent_size):
+    """
+    The previous step structure, for benchmarking: two generator passes, `.item()` syncs and `retain_graph`.
+    """
+    batch_size = real_images.shape[0]
+    D_out_real = D(real_images)
+    label_noise = criterion.sample((3,) + tuple(D_out_real.shape))
+    real_loss = criterion.real_loss(D_out_real, label_noise[0])
+    real_score = torch.mean(criterion.scores(D_out_real)).item()
+
+    fake_images = G(torch.randn(batch_size, latent_size, 1, 1, device=real_images.device))
+    D_out_fake = D(fake_images)
+    fake_loss = criterion.fake_loss(D_out_fake, label_noise[1])
+    fake_score = torch.mean(criterion.scores(D_out_fake)).item()
+
+    loss_d = real_loss + fake_loss
+    optimizerd.zero_grad()
+    loss_d.backward(retain_graph=True)
+    optimizerd.step()
+
+    fake_images2 = G(torch.randn(batch_size, latent_size, 1, 1, device=real_images.device))
+    loss_g = criterion.real_loss(D(fake_images2), label_noise[2])
+    optimizerg.zero_grad()
+    loss_g.backward()
+    optimizerg.step()
+    return loss_g.item(), loss_d.item(), real_score, fake_score
+
+
+def _peak_memory_mb(device):
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_allocated(device) / 2 ** 20
+    # ru_maxrss is the process-wide peak in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_train_step(D, G, real_images, criterion, latent_size, steps=20):
+    """
+    Compare it/s and peak memory of the legacy and restructured training steps.
+
+    Each variant trains its own deep copies of the models, so `D` and `G` are left untouched.
+    On CPU the peak is the process-wide RSS, so the restructured step runs first.
+
+    Returns:
+    - dict: it/s and peak memory in MB per variant.
+    """
+    device = real_images.device
+    report = {}
+    for name, step_fn in (('restructured', train_step), ('legacy', legacy_train_step)):
+        D_copy, G_copy = copy.deepcopy(D), copy.deepcopy(G)
+        optimizerd = optim.Adam(D_copy.parameters(), lr=0.0002, betas=(0.5, 0.999))
+        optimizerg = optim.Adam(G_copy.parameters(), lr=0.0002, betas=(0.5, 0.999))
+        if device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(device)
+
+        step_fn(D_copy, G_copy, real_images, optimizerd, optimizerg, criterion, latent_size)
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        start_time = time.perf_counter()
+        for _ in range(steps):
+            step_fn(D_copy, G_copy, real_images, optimizerd, optimizerg, criterion, latent_size)
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        elapsed = time.perf_counter() - start_time
+
+        report[name] = {'it_per_sec': steps / elapsed, 'peak_memory_mb': _peak_memory_mb(device)}
+        print(f"{name:>12}: {report[name]['it_per_sec']:6.2f} it/s, peak memory {report[name]['peak_memory_mb']:8.1f} MB")
+    return report
+
+
+def benchmark_precision(device, latent_size=256, batch_sizes=(8, 32, 64), steps=5,
+                        modes=(('fp32', False), ('fp32', True), ('bf16', False), ('bf16', True)),
+                        channels=3, image_size=(256, 256)):
+    """
+    Measure training throughput and fp32 parity of precision/layout modes on fresh models.
+
+    Parameters:
+    - device (torch.device): Device to run on.
+    - latent_size (int): Size of the latent noise vector.
+    - batch_sizes (tuple): Batch sizes to benchmark.
+    - steps (int): Timed steps per configuration.
+    - modes (tuple): (precision, channels_last) pairs.
+    - channels (int): Image channels; 1 with `image_size=(n_mels, frames)` benchmarks the native log-mel models.
+    - image_size (tuple): Image (height, width).
+
+    Returns:
+    - dict: images/sec and max abs generator/discriminator output difference to fp32, per (mode, batch size).
+    """
+    device = torch.device(device)
+    criterion = LabelNoiseLoss(device)
+    report = {}
+    for batch_size in batch_sizes:
+        real_images = torch.randn(batch_size, channels, *image_size, device=device)
+        noise = torch.randn(batch_size, latent_size, 1, 1, device=device)
+        for precision, channels_last in modes:
+            torch.manual_seed(0)
+            G = Generator(latent_size, channels, image_size).to(device)
+            D = Discriminator(channels=channels, image_size=image_size).to(device)
+            parity_g = check_parity(G, noise, precision, channels_last)
+            parity_d = check_parity(D, real_images, precision, channels_last)
+
+            set_memory_format(G, channels_last)
+            set_memory_format(D, channels_last)
+            optimizerd = optim.Adam(D.parameters(), lr=0.0002, betas=(0.5, 0.999))
+            optimizerg = optim.Adam(G.parameters(), lr=0.0002, betas=(0.5, 0.999))
+            scaler = make_scaler(device, precision)
+            memory_format = torch.channels_last if channels_last else torch.contiguous_format
+            batch = real_images.contiguous(memory_format=memory_format)
+
+            train_step(D, G, batch, optimizerd, optimizerg, criterion, latent_size, precision, scaler)
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            start_time = time.perf_counter()
+            for _ in range(steps):
+                train_step(D, G, batch, optimizerd, optimizerg, criterion, latent_size, precision, scaler)
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            images_per_sec = steps * batch_size / (time.perf_counter() - start_time)
+
+            name = f"{precision}{'+channels_last' if channels_last else ''}"
+            report[(name, batch_size)] = {'images_per_sec': images_per_sec,
+                                          'parity_g': parity_g, 'parity_d': parity_d}
+            print(f"batch {batch_size:3d} {name:>18}: {images_per_sec:8.1f} images/sec, "
+                  f"max |diff| to fp32: G {parity_g:.2e}, D {parity_d:.2e}")
+    return report
+
+
+def profile_input_pipeline(D, G, dataloaders, criterion, latent_size, device, steps=50, precision='fp32'):
+    """
+    Split the wall time of training steps into waiting for data and computing, per DataLoader.
+
+    Each loader trains its own deep copies of the models, so `D` and `G` are left untouched. The
+    device is synchronized after every step so the compute time covers the whole step; a step is
+    input-bound when its data wait is a large share of the total.
+
+    Parameters:
+    - D (nn.Module): Discriminator model.
+    - G (nn.Module): Generator model.
+    - dataloaders (dict): Loaders to compare by name, e.g. the default and a `make_dataloader` loader.
+    - criterion (LabelNoiseLoss): Label-noise loss.
+    - latent_size (int): Size of the latent noise vector.
+    - device (torch.device): Training device.
+    - steps (int): Profiled steps per loader, after one warm-up step that also starts the workers.
+    - precision (str): Autocast mode of the forward passes.
+
+    Returns:
+    - dict: Mean data-wait and compute ms per step and the data-wait fraction, per loader.
+    """
+    device = torch.device(device)
+    report = {}
+    for name, dataloader in dataloaders.items():
+        D_copy, G_copy = copy.deepcopy(D), copy.deepcopy(G)
+        optimizerd = optim.Adam(D_copy.parameters(), lr=0.0002, betas=(0.5, 0.999))
+        optimizerg = optim.Adam(G_copy.parameters(), lr=0.0002, betas=(0.5, 0.999))
+        scaler = make_scaler(device, precision)
+
+        waits, computes = [], []
+        batches = iter(dataloader)
+        for i in range(min(steps + 1, len(dataloader))):
+            wait_start = time.perf_counter()
+            real_images = next(batches)
+            compute_start = time.perf_counter()
+            real_images = real_images.to(device, non_blocking=True).float()
+            train_step(D_copy, G_copy, real_images, optimizerd, optimizerg, criterion, latent_size, precision, scaler)
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            if i > 0:
+                waits.append(compute_start - wait_start)
+                computes.append(time.perf_counter() - compute_start)
+        del batches
+
+        data_wait_ms = 1000 * sum(waits) / len(waits)
+        compute_ms = 1000 * sum(computes) / len(computes)
+        report[name] = {'data_wait_ms': data_wait_ms, 'compute_ms': compute_ms,
+                        'data_wait_fraction': data_wait_ms / (data_wait_ms + compute_ms)}
+        print(f"{name:>12}: data wait {data_wait_ms:8.2f} ms, compute {compute_ms:8.2f} ms, "
+              f"{100 * report[name]['data_wait_fraction']:5.1f}% of the step waiting for data")
+    return report
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Batched image transforms for SpectoGAN.
+
+`BatchTransform` replaces the per-image `Resize -> ToTensor -> Normalize`
+torchvision pipeline: it takes whole batches of uint8 images, resizes each
+group of equally sized images with one interpolation (on the CPU directly in
+uint8) and normalizes the batch in place with one multiply and one add. `to_uint8` is the inverse for generated images,
+fusing denormalization and quantization to uint8 in one pass. Every call
+records its latency so the per-batch cost can be reported.
+"""
+
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# ImageNet statistics the RGB spectrogram images are normalized with
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class BatchTransform:
+    def __init__(self, size=(256, 256), mean=IMAGENET_MEAN, std=IMAGENET_STD, device='cpu', synchronize=True):
+        """
+        Initialize the BatchTransform.
+        Parameters:
+        - size (tuple): Output (height, width).
+        - mean (tuple): Per-channel mean of the normalization, in [0, 1] units.
+        - std (tuple): Per-channel standard deviation of the normalization, in [0, 1] units.
+        - device (str or torch.device): Device the transform runs on.
+        - synchronize (bool): Wait for the device before recording a latency, so CUDA timings cover the work.
+        """
+        self.size = tuple(size)
+        self.device = torch.device(device)
+        self.synchronize = synchronize and self.device.type == 'cuda'
+        mean = torch.tensor(mean, dtype=torch.float32, device=self.device).view(1, -1, 1, 1)
+        std = torch.tensor(std, dtype=torch.float32, device=self.device).view(1, -1, 1, 1)
+        # (x / 255 - mean) / std == x * scale + bias, folded once so normalizing is a multiply and an add
+        self.scale = 1.0 / (255.0 * std)
+        self.bias = -mean / std
+        # Inverse for quantizing: (y * std + mean) * 255 == y * (255 * std) + 255 * mean
+        self.inverse_scale = 255.0 * std
+        self.inverse_bias = 255.0 * mean
+        self.latencies_ms = []
+
+    def _record(self, start_time):
+        if self.synchronize:
+            torch.cuda.synchronize(self.device)
+        self.latencies_ms.append(1000 * (time.perf_counter() - start_time))
+
+    def resize(self, images):
+        """
+        Resize uint8 images to `size` as float tensors in [0, 255].
+
+        Parameters:
+        - images (torch.Tensor or list): A uint8 (N, C, H, W) batch, or a list of uint8 (C, H, W) tensors of any size;
+          images of equal size are resized together in one interpolation.
+
+        Returns:
+        - torch.Tensor: Float (N, C, height, width) batch on the transform's device.
+        """
+        if isinstance(images, torch.Tensor):
+            groups = {tuple(images.shape[1:]): (list(range(len(images))), images)}
+        else:
+            indices_by_shape = {}
+            for i, image in enumerate(images):
+                indices_by_shape.setdefault(tuple(image.shape), []).append(i)
+            # Stacked as (N, H, W, C) and viewed as NCHW: channels_last, and a plain copy for `pil_to_uint8` images
+            groups = {shape: (indices, torch.stack([images[i].permute(1, 2, 0) for i in indices]).permute(0, 3, 1, 2))
+                      for shape, indices in indices_by_shape.items()}
+
+        channels = next(iter(groups))[0]
+        out = torch.empty((len(images), channels) + self.size, dtype=torch.float32, device=self.device)
+        for (_, height, width), (indices, batch) in groups.items():
+            batch = batch.to(self.device, non_blocking=True)
+            if (height, width) != self.size:
+                if self.device.type == 'cpu' and batch.dtype == torch.uint8:
+                    # The CPU has a vectorized uint8 kernel for channels_last batches
+                    batch = batch.contiguous(memory_format=torch.channels_last)
+                else:
+                    batch = batch.float()
+                # Antialiased bilinear, as torchvision's Resize does on PIL images
+                batch = F.interpolate(batch, size=self.size, mode='bilinear', align_corners=False, antialias=True)
+            if len(indices) == len(images):
+                out.copy_(batch)
+            else:
+                out[indices] = batch.float()
+        return out
+
+    def __call__(self, images):
+        """
+        Resize and normalize a batch of uint8 images; the batched equivalent of
+        `Compose([Resize(size), ToTensor(), Normalize(mean, std)])`.
+        """
+        start_time = time.perf_counter()
+        batch = self.resize(images)
+        # In place on the freshly resized batch, so no second batch-sized buffer is allocated
+        batch.mul_(self.scale).add_(self.bias)
+        self._record(start_time)
+        return batch
+
+    def to_uint8(self, batch):
+        """
+        Denormalize a batch of generated images and quantize it to uint8 (N, C, H, W) in one fused pass.
+        """
+        start_time = time.perf_counter()
+        batch = torch.addcmul(self.inverse_bias, batch.detach().float(), self.inverse_scale)
+        batch = batch.clamp_(0, 255).round_().to(torch.uint8)
+        self._record(start_time)
+        return batch
+
+    def latency_summary(self, reset=True):
+        """
+        Mean and max per-batch latency in ms of the calls recorded so far.
+        """
+        latencies = self.latencies_ms
+        summary = {'batches': len(latencies),
+                   'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+                   'max_ms': max(latencies, default=0.0)}
+        if reset:
+            self.latencies_ms = []
+        return summary
+
+
+def pil_to_uint8(image):
+    """
+    Convert a PIL image into a uint8 (C, H, W) tensor without scaling.
+    """
+    array = np.asarray(image, dtype=np.uint8)
+    if array.ndim == 2:
+        array = array[:, :, None]
+    return torch.from_numpy(array.copy()).permute(2, 0, 1)
+
+
+def benchmark_batch_transform(images, batch_size=64, size=(256, 256), device='cpu'):
+    """
+    Compare the per-batch latency of the per-image torchvision pipeline with `BatchTransform`.
+
+    Parameters:
+    - images (list): PIL images, e.g. `load_spectrogram_image(path).convert('RGB')` for a list of paths.
+    - batch_size (int): Images per batch.
+    - size (tuple): Output (height, width).
+    - device (str or torch.device): Device of the batched transform.
+
+    Returns:
+    - dict: Mean per-batch ms of each variant and the largest absolute difference between their outputs.
+    """
+    import torchvision.transforms as transforms
+
+    compose = transforms.Compose([transforms.Resize(size), transforms.ToTensor(),
+                                  transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)])
+    batch_transform = BatchTransform(size, device=device)
+    batches = [images[start:start + batch_size] for start in range(0, len(images), batch_size)]
+
+    legacy_ms, max_diff = [], 0.0
+    for batch in batches:
+        start_time = time.perf_counter()
+        expected = torch.stack([compose(image) for image in batch])
+        legacy_ms.append(1000 * (time.perf_counter() - start_time))
+
+        # The uint8 tensors are what a DataLoader would collate, so converting them is not timed
+        actual = batch_transform([pil_to_uint8(image) for image in batch])
+        max_diff = max(max_diff, (actual.cpu() - expected).abs().max().item())
+
+    report = {'per_image_ms': sum(legacy_ms) / len(legacy_ms),
+              'batched_ms': batch_transform.latency_summary()['mean_ms'],
+              'max_abs_diff': max_diff}
+    print(f"per-image Compose: {report['per_image_ms']:8.2f} ms/batch, batched: {report['batched_ms']:8.2f} ms/batch, "
+          f"max |diff| {max_diff:.2e}")
+    return report
@@ -13,9 +13,11 @@ To train a GAN on Piano audio
 This code uses the [`pretty_midi`](https://github.com/craffel/pretty-midi) library to create and parse MIDI files, and [`pyfluidsynth`](https://github.com/nwhitehead/pyfluidsynth) for generating audio playback.
 """
 
-!pip install pretty_midi
+# Notebook shell commands, kept for Colab; outside a notebook install the dependencies with
+# pip install -e ".[pianogan]"
+# !pip install pretty_midi
 
-!pip install --upgrade pretty_midi
+# !pip install --upgrade pretty_midi
 
 import collections
 import datetime
@@ -32,8 +34,21 @@ from IPython import display
 from matplotlib import pyplot as plt
 from typing import Optional
 
+from adversarial_audio.audio_io import render_preview, write_midi_audio
+from adversarial_audio.metrics_log import MetricsLogger, epoch_summary, read_metrics
+from adversarial_audio.pianogan_checkpoint import TrainingCheckpoint
+from adversarial_audio.pianogan_generate import build_midi, generate_midi_files, generate_samples, postprocess, write_midi
+from adversarial_audio.pianogan_ingest import ingest_corpus
+from adversarial_audio.pianogan_models import benchmark_joint_training, benchmark_model_construction, build_gan, build_model
+from adversarial_audio.pianogan_notes import midi_to_note_array, notes_to_frame
+from adversarial_audio.pianogan_train import benchmark_train_steps, make_train_step, train, wasserstein_loss
+from adversarial_audio.pianogan_windows import (benchmark_input_pipelines, create_note_sequences,
+                                                create_training_dataset, notes_to_matrix, project_feature)
+
 seed = 42
 tf.random.set_seed(seed)
+# Seeded, checkpointable generator that the training step draws its noise from
+tf.random.set_global_generator(tf.random.Generator.from_seed(seed))
 np.random.seed(seed)
 
 """## Download the Maestro dataset"""
@@ -67,17 +82,16 @@ pm = pretty_midi.PrettyMIDI(sample_file)
 
 import IPython.display as display
 
-def display_audio(pm: pretty_midi.PrettyMIDI, seconds=20, sampling_rate=44100):
-    # Synthesize the MIDI data into an audio waveform
-    audio_data = pm.synthesize(fs=sampling_rate)
-
-    # Take a sample of the generated waveform to mitigate kernel resets
-    waveform_short = audio_data[:int(seconds * sampling_rate)]
+def display_audio(pm, seconds=20, sampling_rate=44100, start_seconds=0.0):
+    # Synthesize only the notes within the first `seconds` (float32), to mitigate kernel resets.
+    # `pm` may also be a MIDI file path, in which case repeated previews come from an LRU cache;
+    # pass a lower sampling_rate (e.g. 22050) for cheaper previews
+    waveform_short = render_preview(pm, seconds, start_seconds, sampling_rate)
 
     # Display the audio
     return display.Audio(waveform_short, rate=sampling_rate)
 
-display_audio(pm)
+display_audio(sample_file)
 
 """Do some inspection on the MIDI file. What kinds of instruments are used?"""
 
@@ -105,25 +119,7 @@ Extract the notes from the sample MIDI file.
 """
 
 def midi_to_notes(midi_file: str) -> pd.DataFrame:
-  pm = pretty_midi.PrettyMIDI(midi_file)
-  instrument = pm.instruments[0]
-  notes = collections.defaultdict(list)
-
-  # Sort the notes by start time
-  sorted_notes = sorted(instrument.notes, key=lambda note: note.start)
-  prev_start = sorted_notes[0].start
-
-  for note in sorted_notes:
-    start = note.start
-    end = note.end
-    notes['pitch'].append(note.pitch)
-    notes['start'].append(start)
-    notes['end'].append(end)
-    notes['step'].append(start - prev_start)
-    notes['duration'].append(end - start)
-    prev_start = start
-
-  return pd.DataFrame({name: np.array(value) for name, value in notes.items()})
+  return notes_to_frame(midi_to_note_array(midi_file))
 
 raw_notes = midi_to_notes(sample_file)
 raw_notes
@@ -189,25 +185,10 @@ def notes_to_midi(
   velocity: int = 100,  # note loudness
 ) -> pretty_midi.PrettyMIDI:
 
-  pm = pretty_midi.PrettyMIDI()
-  instrument = pretty_midi.Instrument(
-      program=pretty_midi.instrument_name_to_program(
-          instrument_name))
-
-  prev_start = 0
-  for i, note in notes.iterrows():
-    start = float(prev_start + note['step'])
-    end = float(start + note['duration'])
-    note = pretty_midi.Note(
-        velocity=velocity,
-        pitch=int(note['pitch']),
-        start=start,
-        end=end,
-    )
-    instrument.notes.append(note)
-    prev_start = start
-
-  pm.instruments.append(instrument)
+  # Each note starts `step` after the previous one
+  start = np.cumsum(notes['step'].to_numpy())
+  end = start + notes['duration'].to_numpy()
+  pm = build_midi(notes['pitch'].to_numpy(), start, end, instrument_name, velocity)
   pm.write(out_file)
   return pm
 
@@ -223,41 +204,32 @@ display_audio(example_pm)
 
 ## Create the training dataset
 
-Create the training dataset by extracting notes from the MIDI files. We start by using a small number of files, and experiment later with more. This may take a couple minutes.
-"""
+Create the training dataset by extracting notes from the MIDI files. The files are parsed in parallel across all cores and their notes are streamed back as they finish.
 
-num_files = 6
-all_notes = []
-for f in filenames[:num_files]:
-  notes = midi_to_notes(f)
-  all_notes.append(notes)
+Parsed files are cached in `cache_dir` as one compressed `.npz` per MIDI file, keyed by the file contents, so re-runs skip parsing.
+"""
 
-all_notes = pd.concat(all_notes)
+num_files = None  # None uses every file; corrupt or multi-instrument files are logged and skipped
+cache_dir = 'note_cache'
+corpus_notes, ingest_stats = ingest_corpus(filenames[:num_files], cache_dir)
+all_notes = notes_to_frame(corpus_notes)
 
 n_notes = len(all_notes)
 print('Number of notes parsed:', n_notes)
 
-"""Next, create a `tf.data.Dataset` from the parsed notes."""
+"""Next, create a single (N, 3) note matrix from the parsed notes. All three features are windowed together from it."""
 
 key_order = ['pitch', 'step', 'duration']
+vocab_size_pitch = 128
 
-# Create separate arrays for pitch, step, and duration
-train_pitch = all_notes[key_order[0]]
-train_step = all_notes[key_order[1]]
-train_duration = all_notes[key_order[2]]
-
-print("Pitch array:", train_pitch[:5])
-print("Step array:", train_step[:5])
-print("Duration array:", train_duration[:5])
+# Pitch (normalized by the vocabulary size), step and duration side by side
+notes_matrix = notes_to_matrix(all_notes, vocab_size_pitch)
 
-print("Length of arrays:", len(train_pitch))
+print("Pitch array:", notes_matrix[:5, 0])
+print("Step array:", notes_matrix[:5, 1])
+print("Duration array:", notes_matrix[:5, 2])
 
-pitch_ds = tf.data.Dataset.from_tensor_slices(train_pitch)
-step_ds = tf.data.Dataset.from_tensor_slices(train_step)
-duration_ds = tf.data.Dataset.from_tensor_slices(train_duration)
-pitch_ds.element_spec
-step_ds.element_spec
-duration_ds.element_spec
+print("Length of arrays:", len(notes_matrix))
 
 # import torch
 # from torch.utils.data import Dataset, DataLoader
@@ -350,89 +322,14 @@ duration_ds.element_spec
 
 #     return sequences.map(split_labels, num_parallel_calls=tf.data.AUTOTUNE)
 
-def create_pitch_sequences(
-    dataset: tf.data.Dataset,
-    seq_length: int,
-    vocab_size=128,  # possible pitch values = 128
-) -> tf.data.Dataset:
-    """Returns TF Dataset of pitch sequences and label examples."""
-    seq_length = seq_length + 1
-
-    # Take 1 extra for the labels
-    windows = dataset.window(seq_length, shift=1, stride=1,
-                              drop_remainder=True)
-
-    # `flat_map` flattens the dataset of datasets into a dataset of tensors
-    flatten = lambda x: x.batch(seq_length, drop_remainder=True)
-    pitch_sequences = windows.flat_map(flatten)
-
-    # Normalize pitch
-    def scale_pitch(x):
-        return x / vocab_size
-
-    # Split the labels
-    def split_pitch_labels(sequences):
-        inputs = sequences[:-1]
-        labels_dense = sequences[-1]
-        return scale_pitch(inputs), scale_pitch(labels_dense)
-
-    return pitch_sequences.map(split_pitch_labels, num_parallel_calls=tf.data.AUTOTUNE)
-
-def create_step_sequences(
-    dataset: tf.data.Dataset,
-    seq_length: int,
-) -> tf.data.Dataset:
-    """Returns TF Dataset of step sequences and label examples."""
-    seq_length = seq_length + 1
-
-    # Take 1 extra for the labels
-    windows = dataset.window(seq_length, shift=1, stride=1,
-                              drop_remainder=True)
-
-    # `flat_map` flattens the dataset of datasets into a dataset of tensors
-    flatten = lambda x: x.batch(seq_length, drop_remainder=True)
-    step_sequences = windows.flat_map(flatten)
-
-    # No need for normalization in this case
-    # Split the labels
-    def split_step_labels(sequences):
-        inputs = sequences[:-1]
-        labels_dense = sequences[-1]
-        return inputs, labels_dense
-
-    return step_sequences.map(split_step_labels, num_parallel_calls=tf.data.AUTOTUNE)
-
-def create_duration_sequences(
-    dataset: tf.data.Dataset,
-    seq_length: int,
-) -> tf.data.Dataset:
-    """Returns TF Dataset of duration sequences and label examples."""
-    seq_length = seq_length + 1
-
-    # Take 1 extra for the labels
-    windows = dataset.window(seq_length, shift=1, stride=1,
-                              drop_remainder=True)
-
-    # `flat_map` flattens the dataset of datasets into a dataset of tensors
-    flatten = lambda x: x.batch(seq_length, drop_remainder=True)
-    duration_sequences = windows.flat_map(flatten)
-
-    # No need for normalization in this case
-    # Split the labels
-    def split_duration_labels(sequences):
-        inputs = sequences[:-1]
-        labels_dense = sequences[-1]
-        return inputs, labels_dense
-
-    return duration_sequences.map(split_duration_labels, num_parallel_calls=tf.data.AUTOTUNE)
-
 """Set the sequence length for each example. Experimenting with various values, we find that the sequence length of 256 gives the best results. The size of the vocabulary (`vocab_size`) is set to 128 representing all the pitches supported by `pretty_midi`."""
 
 seq_length = 256
-vocab_size_pitch = 128
-seq1_ds = create_pitch_sequences(pitch_ds, seq_length, vocab_size_pitch)
-seq2_ds = create_step_sequences(step_ds, seq_length)
-seq3_ds = create_duration_sequences(duration_ds, seq_length)
+notes_ds = create_note_sequences(notes_matrix, seq_length)
+seq1_ds = project_feature(notes_ds, 'pitch')
+seq2_ds = project_feature(notes_ds, 'step')
+seq3_ds = project_feature(notes_ds, 'duration')
+print(notes_ds.element_spec)
 print(seq1_ds.element_spec)
 print(seq2_ds.element_spec)
 print(seq3_ds.element_spec)
@@ -460,28 +357,21 @@ for seq, target in seq3_ds.take(1):
 """Batch the examples, and configure the dataset for performance."""
 
 batch_size = 256
-buffer_size = n_notes - seq_length  # the number of items in the dataset
-train1_ds = (seq1_ds
-            .shuffle(buffer_size)
-            .batch(batch_size, drop_remainder=True)
-            .cache()
-            .prefetch(tf.data.experimental.AUTOTUNE))
-
-train2_ds = (seq2_ds
-            .shuffle(buffer_size)
-            .batch(batch_size, drop_remainder=True)
-            .cache()
-            .prefetch(tf.data.experimental.AUTOTUNE))
-
-train3_ds = (seq3_ds
-            .shuffle(buffer_size)
-            .batch(batch_size, drop_remainder=True)
-            .cache()
-            .prefetch(tf.data.experimental.AUTOTUNE))
+# The note matrix is held once; only window start indices are shuffled, reshuffled every epoch
+train1_ds = create_training_dataset(notes_matrix, seq_length, batch_size, feature='pitch', seed=seed)
+train2_ds = create_training_dataset(notes_matrix, seq_length, batch_size, feature='step', seed=seed)
+train3_ds = create_training_dataset(notes_matrix, seq_length, batch_size, feature='duration', seed=seed)
+# All three features side by side, for the joint model
+train_ds = create_training_dataset(notes_matrix, seq_length, batch_size, seed=seed)
 
 print(train1_ds.element_spec)
 print(train2_ds.element_spec)
 print(train3_ds.element_spec)
+print(train_ds.element_spec)
+
+"""Compare memory peak and steps/sec against the previous shuffle -> batch -> cache chain (each runs in a fresh process)."""
+
+# benchmark_input_pipelines(notes_matrix, seq_length, batch_size)
 
 """## Create and train the model
 
@@ -578,166 +468,40 @@ input_shape = (seq_length, 3)
 dim_mult = 16
 dim = 32
 
-def wasserstein_loss(y_true, y_pred):
-    return tf.reduce_mean(y_true * y_pred)
-
-import tensorflow as tf
-from tensorflow.keras.layers import Input, Dense, Reshape, Flatten, Conv1D, Conv1DTranspose
-from tensorflow.keras.models import Model, Sequential
-from tensorflow.keras.layers import BatchNormalization, Conv1D, Dense, Flatten, MaxPooling1D, Reshape
-from tensorflow.keras.models import Sequential
-
-def build_generator(latent_dim, seq_len):
-    input_layer = Input(shape=(latent_dim,))
-    print("Latent Dimension:", latent_dim)
-
-    x = Dense(128, activation='relu')(input_layer)
-    print("After Dense(128):", x.shape)
-
-    x = Reshape((128, 1))(x)
-    print("After Reshape:", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    x = Conv1DTranspose(64, kernel_size=5, activation='relu', padding='same')(x)
-    print("After Conv1DTranspose(64):", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    x = MaxPooling1D(2)(x)
-    print("After MaxPooling1D:", x.shape)
-
-    x = Conv1DTranspose(32, kernel_size=5, activation='relu', padding='same')(x)
-    print("After Conv1DTranspose(32):", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    x = MaxPooling1D(2)(x)
-    print("After MaxPooling1D:", x.shape)
-
-    x = Conv1DTranspose(16, kernel_size=5, activation='relu', padding='same')(x)
-    print("After Conv1DTranspose(16):", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    x = MaxPooling1D(2)(x)
-    print("After MaxPooling1D:", x.shape)
-
-    x = Conv1DTranspose(4, kernel_size=5, activation='relu', padding='same')(x)
-    print("After Conv1DTranspose(4):", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    # Modify the Flatten layer to ensure compatibility with the subsequent Dense layer
-    x = Flatten()(x)
-    print("After Flatten:", x.shape)
-
-    output_layer = Dense(seq_len, activation='tanh')(x)
-    print("After Dense:", output_layer.shape)
-
-    return Model(inputs=input_layer, outputs=output_layer, name='generator')
-
-
-def build_discriminator(input_dim):
-    input_layer = Input(shape=input_dim)
-    print("Discriminator Input Dimensions:", input_dim)
-
-    x = Reshape((seq_len, 1))(input_layer)
-    print("After Reshape:", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    x = MaxPooling1D(2)(x)
-    print("After MaxPooling1D:", x.shape)
-
-    x = Conv1D(16, kernel_size=5, activation='relu', padding='same')(x)
-    print("After Conv1D(16):", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    x = MaxPooling1D(2)(x)
-    print("After MaxPooling1D:", x.shape)
-
-    x = Conv1D(32, kernel_size=5, activation='relu', padding='same')(x)
-    print("After Conv1D(32):", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    x = MaxPooling1D(2)(x)
-    print("After MaxPooling1D:", x.shape)
-
-    x = Conv1D(64, kernel_size=5, activation='relu', padding='same')(x)
-    print("After Conv1D(64):", x.shape)
-
-    x = BatchNormalization()(x)
-    print("After BatchNormalization:", x.shape)
-
-    x = MaxPooling1D(2)(x)
-    print("After MaxPooling1D:", x.shape)
-
-    x = Flatten()(x)
-    print("After Flatten:", x.shape)
-
-    output_layer = Dense(1, activation='sigmoid')(x)
-    print("After Dense:", output_layer.shape)
-
-    model = Model(inputs=input_layer, outputs=output_layer, name='discriminator')
-    return model
-
-
-def build_gan(generator, discriminator):
-    discriminator.trainable = True
-    input_layer = Input(shape=(latent_dim,))
-    generated_sequence = generator(input_layer)
-    discriminator_output = discriminator(generated_sequence)
-    model = Model(inputs=input_layer, outputs=discriminator_output, name='gan')
-    return model
-
-
 # Specify input dimensions
 latent_dim = 256  # Dimension of the random noise vector
 sequence_dim = seq_len  # Assuming seq_length, pitch, step, duration
 
-# Build the generator
-generator_pitch = build_generator(latent_dim, seq_len)
-generator_step = build_generator(latent_dim, seq_len)
-generator_duration = build_generator(latent_dim, seq_len)
+# Set to True to print every layer's output shape and the model summaries
+verbose_models = False
 
-# Build the discriminator
-discriminator_pitch = build_discriminator(seq_len)
-discriminator_step = build_discriminator(seq_len)
-discriminator_duration = build_discriminator(seq_len)
+# Build one joint generator of (seq_len, 3) pitch/step/duration windows and one discriminator over them,
+# instead of a generator/discriminator/GAN triple per feature ('generator' / 'discriminator' kinds).
+# Inference-only workers can pass lazy=True (and weights_path=...) to defer building until first use
+generator_joint = build_model('joint_generator', verbose=verbose_models, latent_dim=latent_dim, seq_len=seq_len)
+discriminator_joint = build_model('joint_discriminator', verbose=verbose_models, seq_len=seq_len)
+print('Model construction: generator {:.1f} ms, discriminator {:.1f} ms'.format(
+    1000 * generator_joint.construction_seconds, 1000 * discriminator_joint.construction_seconds))
 
 # Build the GAN model
-gan_pitch = build_gan(generator_pitch, discriminator_pitch)
-gan_step = build_gan(generator_step, discriminator_step)
-gan_duration = build_gan(generator_duration, discriminator_duration)
+gan_joint = build_gan(generator_joint, discriminator_joint, latent_dim)
 
 # Compile the discriminator with custom losses
-discriminator_pitch.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(lr=0.00005))
-
-discriminator_step.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(lr=0.00005))
-
-discriminator_duration.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(lr=0.00005))
+discriminator_joint.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(lr=0.00005))
 
 # Compile the GAN model (use binary crossentropy for a binary classification task)
-gan_pitch.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(lr=0.00005))
-gan_step.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(lr=0.00005))
-gan_duration.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(lr=0.00005))
+gan_joint.compile(loss=wasserstein_loss, optimizer=tf.keras.optimizers.RMSprop(lr=0.00005))
 
 # Print a summary of the generator, discriminator, and GAN models
-generator_pitch.summary()
-discriminator_pitch.summary()
-gan_pitch.summary()
+if verbose_models:
+    generator_joint.summary()
+    discriminator_joint.summary()
+    gan_joint.summary()
 
+# To compare steps/sec and parameter counts with training the three per-feature pairs:
+# benchmark_joint_training(latent_dim, seq_len, batch_size)
+# Construction time of the verbose and silent builders, a cached-config rebuild and a lazy model's first call:
+# benchmark_model_construction(latent_dim, seq_len)
 
 
 # # Number of iterations
@@ -843,15 +607,11 @@ for epoch in range(num_epochs):
 
 import numpy as np
 import os
-generator=generator_pitch
-discriminator=discriminator_pitch
-# Function to generate fake data for training the discriminator
-def generate_fake_data(generator, batch_size, latent_dim):
-    noise = np.random.randn(batch_size, latent_dim)
-    return generator.predict(noise)
-
-# Number of training steps
-epochs = 100
+generator=generator_joint
+discriminator=discriminator_joint
+
+# Number of passes over the training windows
+epochs = 20
 batch_size = 256
 latent_dim = 256  # Assuming your latent dimension size
 
@@ -859,47 +619,21 @@ latent_dim = 256  # Assuming your latent dimension size
 output_dir = 'generated_samples'
 os.makedirs(output_dir, exist_ok=True)
 
-# Training loop
-for epoch in range(epochs):
-    # Train the discriminator
-    batch_sequences, batch_labels = next(iter(train1_ds))  # Load real data from your dataset
-    real_data = batch_sequences  # Use only the input sequences for the discriminator
-    fake_data = generate_fake_data(generator, batch_size, latent_dim)
-
-#     print("Real Data", real_data)
-#     print("Fake Data", fake_data)
-    # Labels for real and fake data
-    real_labels = np.ones((batch_size, 1))
-    fake_labels = np.zeros((batch_size, 1))
-
-    # Train discriminator on real data
-    d_loss_real = discriminator.train_on_batch(real_data, real_labels)
-
-    # Train discriminator on fake data
-    d_loss_fake = discriminator.train_on_batch(fake_data, fake_labels)
-
-    # Calculate total discriminator loss
-    d_loss = 0.5 * np.add(d_loss_real, d_loss_fake)
-
-    # Train the generator
-    noise = np.random.randn(batch_size, latent_dim)
-    valid_labels = np.ones((batch_size, 1))
-
-    # Train the generator (via the GAN model)
-    g_loss = gan_pitch.train_on_batch(noise, valid_labels)
+# Discriminator and generator updates compiled into a single graph, reusing the compiled optimizers
+train_step = make_train_step(generator, discriminator, gan_joint.optimizer, discriminator.optimizer, latent_dim)
 
-    # Print progress
-    if epoch % 2 == 0:
-        print(f"Epoch {epoch}, D Loss: {d_loss}, G Loss: {g_loss}")
+# To compare steps/sec with the previous predict + train_on_batch loop on CPU (both variants update the weights):
+# benchmark_train_steps(generator, discriminator, gan_joint, next(iter(train_ds))[0], latent_dim)
 
-    # Optionally, you can save generated samples and display audio at certain intervals
+# Optionally, you can save generated samples and display audio at certain intervals
+def on_epoch_end(epoch, history):
+    global sample_df
     if epoch % 5 == 0:
         # Generate a batch of samples for visualization
         generated_samples = generator.predict(np.random.randn(batch_size, latent_dim))
         for i, sample in enumerate(generated_samples):
             # Convert the generated samples to a DataFrame with columns 'pitch', 'step', 'duration'
-            sample_df = pd.DataFrame(sample, columns=['pitch'])
-            #'step', 'duration'
+            sample_df = pd.DataFrame(sample, columns=key_order)
 
             # Save generated samples as MIDI files
             #midi_file = os.path.join(output_dir, f'generated_sample_epoch_{epoch}_sample_{i}.midi')
@@ -908,44 +642,54 @@ for epoch in range(epochs):
         # Display the audio of the last generated sample
         #sample_midi = pretty_midi.PrettyMIDI(os.path.join(output_dir, f'generated_sample_epoch_{epoch}_sample_{i}.midi'))
         #display_audio(sample_midi)
-print(sample_df)
 
-sample_df.shape
+# Training loop: one long-lived iterator, full reshuffled passes over the data
+# Weights, optimizer slots, RNG, iterator position and history are saved asynchronously after every
+# epoch (last 3 kept); rerunning this cell resumes from the latest checkpoint
+checkpoint = TrainingCheckpoint('checkpoints/joint', generator, discriminator, gan_joint.optimizer,
+                                discriminator.optimizer, keep_last=3)
+# Per-step losses, data-wait, step time and samples/sec are appended to this log
+metrics_path = 'logs/joint_metrics.csv'
+# Set by on_epoch_end; stays None when a resumed run has no epochs left to train
+sample_df = None
+with MetricsLogger(metrics_path) as metrics:
+    history = train(train_step, train_ds, epochs, on_epoch_end=on_epoch_end, checkpoint=checkpoint,
+                    metrics=metrics)
+print('Iterator setup: {:.3f}s, mean input latency: {:.2f} ms/step'.format(
+    history['iterator_setup_seconds'], 1000 * np.mean(history['input_latency'])))
+if sample_df is not None:
+    print(sample_df)
+    print(sample_df.shape)
 
 # from keras.models import load_model
 
 # # Load the model with custom objects
 # generator = load_model("/kaggle/input/aaaaaaa/generator_model.h5")
 
-generated_samples = generator.predict(np.random.randn(256, 256))
-sample_df2 = pd.DataFrame(generated_samples[200], columns=['pitch'])*128
-for i in range(len(sample_df2)):
-    if(sample_df2.iloc[i]['pitch']<0):
-        sample_df2.iloc[i]['pitch']=0
-
-
-
-start=pd.DataFrame(np.linspace(0,25.6,256))
-end=pd.DataFrame(np.linspace(0.1,25.7,256))
-duration=pd.DataFrame(np.full(256,0.3))
-step=pd.DataFrame(np.full(256,0.025))
-
-result = pd.concat([sample_df2,start,end,step,duration], axis=1, ignore_index=True)
-result = result.rename(columns={0:'pitch',1: 'start', 2:'end',3:'step',4:'duration'})
+# Generate pieces in batched forward passes, then scale, clip and quantize them as whole arrays
+generated_samples = generate_samples(generator, 256, seed=seed, latent_dim=latent_dim)
+# The joint generator produces step and duration too; step/duration below only apply to pitch-only generators
+pieces = postprocess(generated_samples, vocab_size=vocab_size_pitch, step=0.025, duration=0.3)
+result = notes_to_frame(pieces[200])
 result
 
 import os
 output_dir = 'generated_samples'
 os.makedirs(output_dir, exist_ok=True)
 midi_file2 = os.path.join(output_dir, "test")
-notes_to_midi(result, midi_file2, instrument_name='Acoustic Grand Piano')
-pm = pretty_midi.PrettyMIDI(midi_file2)
+pm = write_midi(pieces[200], midi_file2, instrument_name='Acoustic Grand Piano')
+
+# Write many pieces at once
+# midi_paths = generate_midi_files(generator, 1000, output_dir, seed=seed, latent_dim=latent_dim)
 
 display_audio(pm,seconds=100)
 
+# Render the whole piece to a WAV file in fixed-size blocks, with memory bounded by one block
+write_midi_audio(pm, os.path.join(output_dir, "test.wav"))
+
 plot_piano_roll(result,count =100)
 
-#notes taken with constant duration and step
+#notes taken with the generated duration and step
 
 plot_piano_roll(result, count=100)
 
@@ -954,56 +698,22 @@ generated_samples = generator.predict(np.random.randn(256, 256))
 generated_samples[1]
 
 import matplotlib.pyplot as plt
-epochs = [0, 2, 4, 6, 8, 10, 12, 14, 16, 18, 20, 22, 24, 26, 28, 30, 32, 34, 36, 38, 40, 42, 44, 46, 48, 50, 52, 54, 56, 58, 60, 62, 64, 66, 68, 70, 72, 74, 76, 78, 80, 82, 84, 86, 88, 90, 92, 94, 96, 98]
+# Per-epoch mean losses, read from the training metrics log
+loss_summary = epoch_summary(read_metrics(metrics_path), ['d_loss', 'g_loss'])
+epochs = loss_summary.index.to_numpy()
 
 import numpy as np
 # D Loss values
-d_loss = np.array([
-    0.2920251786708832, 0.03161967918276787, 0.011338106356561184,
-    0.005308095365762711, 0.004808263387531042, 0.0026066747959703207,
-    0.0020404639653861523, 0.0015092107933014631, 0.0011652172543108463,
-    0.0009689380531199276, 0.0006757030496373773, 0.0004580605309456587,
-    0.00041552470065653324, 0.00033641277696006, 0.00031304301228374243,
-    0.0001909250277094543, 0.00020026907441206276, 0.0001904071104945615,
-    0.0001459774939576164, 0.00010897631000261754, 0.0001023140866891481,
-    8.055778744164854e-05, 6.957093864912167e-05, 7.795784767949954e-05,
-    6.160305201774463e-05, 3.685287811094895e-05, 5.681292896042578e-05,
-    5.058090027887374e-05, 2.9633472877321765e-05, 3.456480772001669e-05,
-    3.535534051479772e-05, 3.042946264031343e-05, 3.713547994266264e-05,
-    2.5414185074623674e-05, 1.7674185073701665e-05, 1.6161360690603033e-05,
-    1.7115609807660803e-05, 1.5747784345876426e-05, 2.0457700884435326e-05,
-    1.2434987183951307e-05, 1.3282451618579216e-05, 1.9501216229400598e-05,
-    1.385666382702766e-05, 1.664140472712461e-05, 1.3910213056078646e-05,
-    1.0794241461553611e-05, 1.2906237316201441e-05, 1.1779691703850403e-05,
-    1.1243426342844032e-05, 1.1778650332416873e-05
-])
-
-g_loss = np.array([
-    0.261537104845047, 0.011480811983346939, 0.0055380892008543015,
-    0.0028597088530659676, 0.001475492026656866, 0.0008079035906121135,
-    0.0009942954638972878, 0.0005840265075676143, 0.00045898609096184373,
-    0.0003898304421454668, 0.0003184705856256187, 0.000249086762778461,
-    0.0002215020649600774, 0.0001480580394854769, 0.0001581714313942939,
-    0.00011821807129308581, 0.00010311401274520904, 0.00010746873886091635,
-    5.7362743973499164e-05, 4.696515679825097e-05, 2.8831967938458547e-05,
-    3.6129124055150896e-05, 3.059186929021962e-05, 3.000184369739145e-05,
-    2.8734344596159644e-05, 1.632794737815857e-05, 2.0252475223969668e-05,
-    1.3276258869154844e-05, 1.1707261364790611e-05, 1.6095247701741755e-05,
-    1.7478634617873468e-05, 1.4613614439440425e-05, 1.1372459084668662e-05,
-    1.0899967492150608e-05, 6.756370112270815e-06, 6.989296252868371e-06,
-    7.354300123552093e-06, 1.4875422493787482e-05, 1.0269224731018767e-05,
-    7.741796252958011e-06, 7.202092092484236e-06, 6.12793382970267e-06,
-    5.0603912313818e-06, 5.477448212332092e-06, 3.512198190946947e-06,
-    5.1513061407604255e-06, 4.66870278614806e-06, 4.737097697216086e-06,
-    3.415294486330822e-06, 4.4192097448103596e-06
-])
+d_loss = loss_summary['d_loss'].to_numpy()
+
+g_loss = loss_summary['g_loss'].to_numpy()
 #
 
 # Checking the length of d_loss and g_loss
 print(len(d_loss), len(g_loss))
 plt.plot(epochs, d_loss, label='Discriminator Loss', color='red')
 plt.plot(epochs, g_loss, label='Generator Loss', color='blue')
-plt.yscale('log')
+# Wasserstein losses are routinely negative, so the scale stays linear
 plt.title('Discriminator and Generator Losses Over Epochs')
 plt.xlabel('Epochs')
 plt.ylabel('Loss')
@@ -1017,11 +727,11 @@ plt.show()
 # Save the GAN model
 from tensorflow.keras.models import Sequential, save_model
 model_path = 'gan_model.h5'
-save_model(gan_pitch, model_path)
+save_model(gan_joint, model_path)
 
 # Optionally, save the generator and discriminator separately
 generator_path = 'generator_model.h5'
-save_model(generator_pitch, generator_path)
+save_model(generator_joint, generator_path)
 
 discriminator_path = 'discriminator_model.h5'
-save_model(discriminator_pitch, discriminator_path)
\ No newline at end of file
+save_model(discriminator_joint, discriminator_path)
\ No newline at end of file
@@ -7,9 +7,11 @@ Original file is located at
     https://colab.research.google.com/drive/1Mz_avX_uzCSKRYvswb46o7n9o80Q0Xe1
 """
 
-!pip install tensorflow_io
-! pip install soundfile
-! pip install pygame
+# Notebook shell commands, kept for Colab; outside a notebook install the dependencies with
+# pip install -e ".[spectogan]"
+# !pip install tensorflow_io
+# ! pip install soundfile
+# ! pip install pygame
 
 #import required libraries
 from tensorflow.keras.layers import Dense, Permute, Reshape, Input
@@ -72,13 +74,25 @@ import torch.optim as optim
 from skimage import io, transform
 from torch.utils.data import Dataset, DataLoader, random_split
 import torchvision.transforms as transforms
+from torchvision.io import write_png
+from torchvision.utils import make_grid, save_image
 import matplotlib.pyplot as plt
 import librosa
 from sklearn.preprocessing import normalize
 import matplotlib.pyplot as plt
 import librosa.display
-from pydub import AudioSegment
-from pydub.playback import play
+from adversarial_audio.audio_io import export_batch
+from adversarial_audio.metrics_log import MetricsLogger, epoch_summary, read_metrics
+from adversarial_audio.spectogan_checkpoint import CheckpointManager
+from adversarial_audio.spectogan_features import (HOP_LENGTH, N_FFT, N_FRAMES, N_MELS, denormalize_db,
+                                                   featurize_files, load_spectrogram_image, log_mel_to_power)
+from adversarial_audio.spectogan_losses import LabelNoiseLoss, benchmark_loss_overhead
+from adversarial_audio.spectogan_models import Discriminator, Generator
+from adversarial_audio.spectogan_store import LogMelDataset, MemmapSpectrogramDataset, make_dataloader, pack_dataset
+from adversarial_audio.spectogan_train import benchmark_precision, benchmark_train_step, profile_input_pipeline, train
+from adversarial_audio.spectogan_transforms import (IMAGENET_MEAN, IMAGENET_STD, BatchTransform,
+                                                     benchmark_batch_transform, pil_to_uint8)
+from adversarial_audio.spectogan_vocoder import MelInverter, benchmark_inversion, benchmark_phase_reconstruction
 
 """Visualization"""
 
@@ -198,40 +212,16 @@ audio_files = [filename for filename in os.listdir(train_dir) if filename.endswi
 # Randomly sample audio files
 selected_files = random.sample(audio_files, min(max_images, len(audio_files)))
 
-# Counter for the number of saved images
-image_count = 0
-
-# Iterate through randomly selected audio files
-for filename in selected_files:
-    file_path = os.path.join(train_dir, filename)
-
-    # Load audio file
-    audio, sample_rate = librosa.load(file_path, sr=None)
-
-    # Compute spectrogram
-    spectrogram = librosa.feature.melspectrogram(audio, sr=sample_rate)
-    log_spectrogram = librosa.power_to_db(spectrogram, ref=np.max)
-
-    # Visualize and save the spectrogram as an image without axis labels and color bar
-    plt.figure(figsize=(10, 4))
-    librosa.display.specshow(log_spectrogram, sr=sample_rate, x_axis=None, y_axis=None)
-    plt.axis('off')  # Turn off axis labels
-    plt.colorbar(format='%+2.0f dB', pad=0)  # Turn off color bar
-    plt.savefig(os.path.join(output_dir, f'{filename.split(".")[0]}.png'), bbox_inches='tight', pad_inches=0)
-    plt.close()
-
-    # Increment the image count
-    image_count += 1
-    if(image_count%100==0):
-        print(image_count)
+# Compute log-mel arrays in parallel and write them straight to disk as .npy files
+spectrogram_paths = featurize_files([os.path.join(train_dir, filename) for filename in selected_files], output_dir)
 
 # Optionally, you can also save the labels for reference
 labels_file_path = os.path.join(output_dir, "labels.txt")
 with open(labels_file_path, "w") as f:
-    for filename in selected_files:
-        f.write(f'{filename.split(".")[0]}.png\n')
+    for path in spectrogram_paths:
+        f.write(f'{os.path.basename(path)}\n')
 
-print(f"Spectrogram images saved to {output_dir}")
+print(f"Spectrograms saved to {output_dir}")
 
 # Check if a GPU is available, and set the device accordingly
 
@@ -243,14 +233,9 @@ else:
 #print available device
 device
 
-#Transforming the image by resizing it into 128*128 making it lesser expensive, and further normalizing it
-transform = transforms.Compose([transforms.Resize((256, 256)),
-#                                 transforms.CenterCrop(256),
-                                transforms.ToTensor(),
-                            transforms.Normalize(mean=[0.485,0.456,0.406],std=[0.229, 0.224, 0.225])])
-#Denormalization transformation
-denorm = transforms.Compose([
-     transforms.Normalize(mean=[-0.485,-0.456,-0.406],std=[1/0.229, 1/0.224, 1/0.225])])
+#Transforming the images by resizing them to 256*256 and normalizing them, a whole uint8 batch at a time;
+#batch_transform.to_uint8 denormalizes and quantizes generated images for display and saving
+batch_transform = BatchTransform((256, 256), mean=IMAGENET_MEAN, std=IMAGENET_STD, device=device)
 
 # Define a custom dataset class for images
 class ImageDataset(Dataset):
@@ -260,6 +245,7 @@ class ImageDataset(Dataset):
         Parameters:
         - images_list (list): List of file paths to the images.
         - transform (callable, optional): Optional transformation to be applied to the images.
+          Without one, images are returned as uint8 (C, H, W) tensors for a `BatchTransform`.
         """
         self.images_list = images_list
         self.transform = transform
@@ -275,30 +261,48 @@ class ImageDataset(Dataset):
         Get an image and its corresponding label from the dataset.
         """
         image_path = self.images_list[index]
-        image = Image.open(image_path).convert('RGB')
+        image = load_spectrogram_image(image_path).convert('RGB')
 
         # Apply the specified transformation if provided
         if self.transform:
-            image = self.transform(image)
+            return self.transform(image)
+
+        return pil_to_uint8(image)
 
-        return image
+# Spectrogram representation the GAN is trained on:
+# 'rgb'    - 3x256x256 images rendered from the spectrograms and resized (the original setup)
+# 'native' - 1 x n_mels x frames log-mel tensors with a fixed dB normalization; about 3x less
+#            memory and compute per sample, and generated tensors invert back to dB exactly
+spectrogram_mode = 'rgb'
 
 # Specify the path to the directory containing the images
 train_set_path = "/kaggle/working/train_set"
 
-# Create a list of file paths for images with a ".png" extension in the specified directory
-image_paths_list = [os.path.join(train_set_path, filename) for filename in os.listdir(train_set_path) if filename.endswith(".png")]
+# Create a list of file paths for spectrograms (".npy" arrays or legacy ".png" images) in the specified directory
+image_paths_list = [os.path.join(train_set_path, filename) for filename in os.listdir(train_set_path) if filename.endswith((".npy", ".png"))]
 # Specify batch size
 batch_size = 32
-image_dataset = ImageDataset(image_paths_list, transform)
-# Create DataLoader
-dataloader = DataLoader(image_dataset, batch_size=batch_size, shuffle=True)
+if spectrogram_mode == 'native':
+    image_paths_list = [path for path in image_paths_list if path.endswith(".npy")]
+    image_dataset = LogMelDataset(image_paths_list)
+    model_kwargs = {'channels': 1, 'image_size': (N_MELS, N_FRAMES)}
+else:
+    image_dataset = ImageDataset(image_paths_list)
+    model_kwargs = {}
+# Decode, resize and normalize every spectrogram once into a memory-mapped float16 store
+store_path = "/kaggle/working/train_store" if spectrogram_mode == 'rgb' else "/kaggle/working/train_store_native"
+if not os.path.exists(store_path + ".json"):
+    pack_dataset(image_dataset, store_path, dtype="float16", names=image_paths_list,
+                 batch_transform=batch_transform if spectrogram_mode == 'rgb' else None)
+train_dataset = MemmapSpectrogramDataset(store_path)
+# Create DataLoader: a persistent worker pool sized to the available cores, pinned memory and whole-batch gathers
+dataloader = make_dataloader(train_dataset, batch_size=batch_size, shuffle=True)
 #testing the traindataset
-plt.imshow(image_dataset.__getitem__(2).numpy().transpose(1,2,0))
+plt.imshow(image_dataset.__getitem__(2).numpy().transpose(1,2,0).squeeze())
 image_dataset.__getitem__(2).numpy().transpose(1,2,0).shape
 
 image_path = image_paths_list.__getitem__(2)
-image = Image.open(image_path)
+image = load_spectrogram_image(image_path)
 
 plt.imshow(image)
 plt.show()
@@ -307,63 +311,17 @@ plt.show()
 for i in range(16):
     print(image_paths_list[i])
 
-class Generator(nn.Module):
-    def __init__(self, latent_size):
-        """
-        Initialize the Generator module.
-        """
-        super(Generator, self).__init__()
-
-        # Define the layers for the generator
-        # We would be generating 256*256 images in RGB channel, thus would need more ConvTranspose layers
-        self.main = nn.Sequential(
-            nn.ConvTranspose2d(in_channels=latent_size, out_channels=1024, kernel_size=4, stride=1, padding=0),
-            nn.BatchNorm2d(1024),
-            nn.ReLU(),  # 4x4
-
-            nn.ConvTranspose2d(in_channels=1024, out_channels=512, kernel_size=4, stride=2, padding=1),
-            nn.BatchNorm2d(512),
-            nn.ReLU(),  # 8x8
-
-            nn.ConvTranspose2d(in_channels=512, out_channels=256, kernel_size=4, stride=2, padding=1),
-            nn.BatchNorm2d(256),
-            nn.ReLU(),  # 16x16
-
-            nn.ConvTranspose2d(in_channels=256, out_channels=128, kernel_size=4, stride=2, padding=1),
-            nn.BatchNorm2d(128),
-            nn.ReLU(),  # 32x32
-
-            nn.ConvTranspose2d(in_channels=128, out_channels=64, kernel_size=4, stride=2, padding=1),
-            nn.BatchNorm2d(64),
-            nn.ReLU(),  # 64x64
-
-            nn.ConvTranspose2d(in_channels=64, out_channels=32, kernel_size=4, stride=2, padding=1),
-            nn.BatchNorm2d(32),
-            nn.ReLU(),  # 128x128
-
-            nn.ConvTranspose2d(in_channels=32, out_channels=3, kernel_size=4, stride=2, padding=1),
-            nn.Tanh()  # 256x256
-        )
-
-    def forward(self, x):
-        """
-        Forward pass through the generator.
-        """
-        # Outputting a 3x256x256 image
-        x = self.main(x)
-        return x
-
 # Clear GPU memory cache to free up memory
 torch.cuda.empty_cache()
 # Instantiate the Generator and move it to the specified device (GPU if available)
-GeneratorI = Generator(256).to(device)
+GeneratorI = Generator(256, **model_kwargs).to(device)
 # Generate random noise according to the batch size of 32 and image size of 128x128
 noise = torch.randn(32, 256, 1, 1).to(device)
 
 # Test the Generator, note that the generated image may look random as the weights are not trained yet
 fake_images = GeneratorI(noise)
 # Display one of the generated images
-plt.imshow(fake_images[0].detach().cpu().numpy().transpose(1, 2, 0))
+plt.imshow(fake_images[0].detach().cpu().numpy().transpose(1, 2, 0).squeeze())
 
 # Define a function to display a grid of images
 def show_images(images, nmax=64):
@@ -382,48 +340,7 @@ def show_images(images, nmax=64):
     # Display the images using make_grid
     ax.imshow(make_grid(images.detach()[:nmax], nrow=8).cpu().permute(1, 2, 0))
 
-class Discriminator(nn.Module):
-    def __init__(self):
-        """
-        Initialize the Discriminator module.
-        """
-        super(Discriminator, self).__init__()
-
-        # Define the layers for the discriminator
-        self.main = nn.Sequential(
-            nn.Conv2d(in_channels=3, out_channels=64, kernel_size=4, stride=2, padding=1),  # 128*128
-            nn.BatchNorm2d(64),
-            nn.LeakyReLU(0.2, inplace=True),
-
-            nn.Conv2d(in_channels=64, out_channels=128, kernel_size=4, stride=2, padding=1),  # 64*64
-            nn.BatchNorm2d(128),
-            nn.LeakyReLU(0.2, inplace=True),
-
-            nn.Conv2d(in_channels=128, out_channels=256, kernel_size=4, stride=2, padding=1),  # 32*32
-            nn.BatchNorm2d(256),
-            nn.LeakyReLU(0.2, inplace=True),
-
-            nn.Conv2d(in_channels=256, out_channels=512, kernel_size=4, stride=2, padding=1),  # 16*16
-            nn.BatchNorm2d(512),
-            nn.LeakyReLU(0.2, inplace=True),
-
-            nn.Conv2d(in_channels=512, out_channels=1024, kernel_size=4, stride=2, padding=1),  # 8*8
-            nn.BatchNorm2d(1024),
-            nn.LeakyReLU(0.2, inplace=True),
-
-            nn.Conv2d(in_channels=1024, out_channels=1, kernel_size=4, stride=2, padding=0),  # 4*4
-            nn.Flatten(),
-            nn.Sigmoid()
-        )
-
-    def forward(self, x):
-        """
-        Forward pass through the discriminator.
-        """
-        x = self.main(x)
-        return x
-
-DiscriminatorI=Discriminator().to(device)
+DiscriminatorI=Discriminator(**model_kwargs).to(device)
 
 # Initialize Adam optimizer for the discriminator with a learning rate of 0.0002 and betas (0.5, 0.999)
 optimizerd = optim.Adam(DiscriminatorI.parameters(), lr=0.0002, betas=(0.5, 0.999))
@@ -431,34 +348,13 @@ optimizerd = optim.Adam(DiscriminatorI.parameters(), lr=0.0002, betas=(0.5, 0.99
 # Initialize Adam optimizer for the generator with a learning rate of 0.0002 and betas (0.5, 0.999)
 optimizerg = optim.Adam(GeneratorI.parameters(), lr=0.0002, betas=(0.5, 0.999))
 
-# Define binary cross-entropy loss
-loss_fn = nn.BCELoss()
+# Binary cross-entropy against targets smoothed with Beta(1, 5) label noise.
+# The noise distribution lives on the device and all noise of a step is drawn at once;
+# pass with_logits=True together with Discriminator(logits=True) for the fused BCE-with-logits path
+criterion = LabelNoiseLoss(device)
 
-# Define a function for computing the real loss with added label noise
-def Real_loss(preds, targets):
-    """
-    Compute the real loss with added label noise.
-    """
-    # Drawing label noise from a beta distribution
-    beta_distr = torch.distributions.beta.Beta(1, 5, validate_args=None)
-    label_noise = beta_distr.sample(sample_shape=targets.shape).to(torch.device(device))
-
-    # Compute the real loss with added label noise
-    loss = loss_fn(targets, preds - label_noise)
-    return loss
-
-# Define a function for computing the fake loss with added label noise
-def Fake_loss(preds, targets):
-    """
-    Compute the fake loss with added label noise.
-    """
-    # Drawing label noise from the beta distribution
-    beta_distr = torch.distributions.beta.Beta(1, 5, validate_args=None)
-    label_noise = beta_distr.sample(sample_shape=targets.shape).to(torch.device(device))
-
-    # Compute the fake loss with added label noise
-    loss = loss_fn(targets, preds + label_noise)
-    return loss
+# To measure the per-step loss overhead against constructing Beta(1, 5) on every call:
+# benchmark_loss_overhead(device)
 
 # Set batch size and latent size
 batch_size = 32
@@ -470,107 +366,56 @@ losses_d = []
 real_scores = []
 fake_scores = []
 
-def train(D, G, epochs):
-    """
-    Train the GAN model.
-
-    Parameters:
-    - D (nn.Module): Discriminator model.
-    - G (nn.Module): Generator model.
-    - epochs (int): Number of training epochs.
-    """
-    # Iterate over epochs
-    for epoch in range(epochs):
-        j = 0
-        # Iterate over batches in the dataloader
-        for real_images in dataloader:
-            j += 1
-            real_images = real_images.to(device)
-
-            # Pass real images through discriminator
-            D_out_real = D(real_images)
-            label_real = torch.full(D_out_real.shape, 1.0).to(torch.device(device))
-            real_loss = Real_loss(label_real, D_out_real)
-            real_score = torch.mean(D_out_real).item()
-
-            # Generate fake images
-            noise = torch.randn(batch_size, latent_size, 1, 1).to(torch.device(device))
-            fake_images = G(noise)
-
-            # Pass fake images through discriminator
-            D_out_fake = D(fake_images)
-            label_fake = torch.full(D_out_fake.shape, 0).to(torch.device(device))
-            fake_loss = Fake_loss(label_fake, D_out_fake)
-            fake_score = torch.mean(D_out_fake).item()
-
-            # Update discriminator weights
-            loss_d = real_loss + fake_loss
-            optimizerd.zero_grad()
-            loss_d.backward(retain_graph=True)
-            optimizerd.step()
-
-            # Generate fake images for generator training
-            noise2 = torch.randn(batch_size, latent_size, 1, 1).to(torch.device(device))
-            fake_images2 = G(noise2)
-
-            gen_steps = 1
-            for i in range(gen_steps):
-                # Try to fool the discriminator
-                D_out_fake2 = D(fake_images2)
-
-                # The label is set to 1 (real-like) to fool the discriminator
-                label_real1 = torch.full(D_out_fake2.shape, 1.0).to(torch.device(device))
-                loss_g = Real_loss(label_real1, D_out_fake2)
-
-                # Update generator weights
-                optimizerg.zero_grad()
-                loss_g.backward(retain_graph=(i < gen_steps - 1))
-                optimizerg.step()
-
-            print(f"\rProgress: {j}/{len(dataloader)}", end='')
-
-        # Log losses & scores (last batch)
-        losses_g.append(loss_g.item())
-        losses_d.append(loss_d.item())
-        real_scores.append(real_score)
-        fake_scores.append(fake_score)
-
-        # Log training progress for the epoch
-        print("\nEpoch [{}/{}], loss_g: {:.4f}, loss_d: {:.4f}, real_score: {:.4f}, fake_score: {:.4f}".format(
-            epoch + 1, epochs, loss_g, loss_d, real_score, fake_score))
-
-# Example usage:
-# train(DiscriminatorI, GeneratorI, epochs=10)
+# One generator pass per step, fakes detached for the discriminator update, no retain_graph;
+# metrics stay on the device and are only read back every `log_interval` batches
+# To compare it/s and peak memory with the previous step structure:
+# benchmark_train_step(DiscriminatorI, GeneratorI, next(iter(dataloader)).to(device).float(), criterion, latent_size)
+
+# Opt-in faster execution: precision='bf16' (CPU / recent GPUs) or 'fp16' (CUDA, with loss scaling),
+# and channels_last=True for the convolutions. Throughput and fp32 parity at batch sizes 8/32/64:
+# benchmark_precision(device)
+# The same measurement for the native single-channel log-mel models:
+# benchmark_precision(device, channels=1, image_size=(N_MELS, N_FRAMES))
+# Per-batch latency of the per-image torchvision transforms and the batched tensor transform:
+# benchmark_batch_transform([load_spectrogram_image(path).convert('RGB') for path in image_paths_list[:512]],
+#                           device=device)
+# Share of each step spent waiting for data, with the single-threaded loader and the tuned one:
+# profile_input_pipeline(DiscriminatorI, GeneratorI,
+#                        {'default': DataLoader(train_dataset, batch_size=batch_size, shuffle=True),
+#                         'tuned': dataloader}, criterion, latent_size, device)
+
+# Models, optimizers, RNG states and history are saved in the background after every epoch (last 3 kept);
+# rerunning this cell resumes from the latest checkpoint in the directory
+checkpoints = CheckpointManager("/kaggle/working/checkpoints", keep_last=3)
+
+# Per-step losses, scores, data-wait, forward/backward times and samples/sec are appended to this log
+metrics_path = "/kaggle/working/logs/spectogan_metrics.csv"
 
 #Training the Generator and Dicriminator for 20 epochs
-train(DiscriminatorI,GeneratorI,20)
+with MetricsLogger(metrics_path) as metrics:
+    history = train(DiscriminatorI, GeneratorI, dataloader, optimizerd, optimizerg, criterion,
+                    epochs=20, latent_size=latent_size, device=device, precision='fp32', channels_last=False,
+                    checkpoint=checkpoints, checkpoint_every=1, metrics=metrics)
+
+# Log losses & scores (mean over each epoch)
+losses_g.extend(history['loss_g'])
+losses_d.extend(history['loss_d'])
+real_scores.extend(history['real_score'])
+fake_scores.extend(history['fake_score'])
 
 import numpy as np
 import matplotlib.pyplot as plt
 
-# Generator Loss values over 20 epochs
-loss_g_values = [2.8315, 1.3681, 1.6083, 1.5575, 1.4697, 1.5005, 1.3649, 1.6945, 1.4224, 1.5659, 1.6489, 2.1721, 2.4409, 1.3518, 1.0917, 0.7588, 1.4144, 1.6383, 1.5869, 1.7615]
+# Per-epoch means of the per-step metrics, read from the training metrics log
+metrics_summary = epoch_summary(read_metrics(metrics_path), ['loss_g', 'loss_d', 'real_score', 'fake_score'])
 
-# Discriminator Loss values over 20 epochs
-loss_d_values = [0.9912, 0.9165, 0.9131, 0.8830, 0.9077, 0.9224, 0.9367, 0.9289, 0.9140, 0.9591, 0.9300, 2.0082, 1.0397, 1.0343, 1.0426, 1.0366, 1.1107, 1.1450, 0.9256, 0.8731]
+# Epoch numbers, starting at 1
+epochs = metrics_summary.index.to_numpy() + 1
 
-# Real Score values over 20 epochs
-real_score_values = [0.8069, 0.8020, 0.8394, 0.8334, 0.8311, 0.8239, 0.7895, 0.8374, 0.8385, 0.8264, 0.7762, 0.9258, 0.8246, 0.7049, 0.7184, 0.7123, 0.7687, 0.8626, 0.7812, 0.7892]
-
-# Fake Score values over 20 epochs
-fake_score_values = [0.3367, 0.1142, 0.1667, 0.1549, 0.1966, 0.1831, 0.1915, 0.1182, 0.1624, 0.1414, 0.1505, 0.7976, 0.3915, 0.3494, 0.3653, 0.2993, 0.4452, 0.4850, 0.2093, 0.1374]
-
-import matplotlib.pyplot as plt
-import numpy as np
-
-# Generate an array of epoch numbers (1 to 20)
-epochs = np.arange(1, 21)
-
-# Sample data (replace these with your actual data)
-loss_g_values = np.random.rand(20)
-loss_d_values = np.random.rand(20)
-real_score_values = np.random.rand(20)
-fake_score_values = np.random.rand(20)
+loss_g_values = metrics_summary['loss_g'].to_numpy()
+loss_d_values = metrics_summary['loss_d'].to_numpy()
+real_score_values = metrics_summary['real_score'].to_numpy()
+fake_score_values = metrics_summary['fake_score'].to_numpy()
 
 # Plot all in one
 fig, axes = plt.subplots(2, 2, figsize=(15, 10))
@@ -614,41 +459,76 @@ plt.show()
 noise1 = torch.randn(1, 256, 1, 1).to(device)
 #Generating fake images using the noise
 fake_images=GeneratorI(noise1)
-#Showing the fake images generated
-show_images((fake_images))
-
 # Output path for the fake image
 output_path = "/kaggle/working/fake_image3.png"  # Replace with the desired output path and filename
 
-# Save the generated fake image
-save_image(fake_images, output_path, normalize=True)
-
-# Load the mel spectrogram image
-mel_spectrogram_image_path = "/kaggle/working/fake_image3.png"  # Replace with the actual path
-mel_spectrogram = plt.imread(mel_spectrogram_image_path)
-
-# Invert the power-to-db transformation
-spectrogram = librosa.db_to_power(mel_spectrogram)
-
-# Invert the mel spectrogram to a linear spectrogram
-mel_basis = librosa.filters.mel(sr=44100, n_fft=2048, n_mels=256)
-inv_mel_spectrogram = np.dot(np.linalg.pinv(mel_basis), spectrogram)
-
-# Invert the linear spectrogram to the time-domain signal
-audio_signal = librosa.feature.inverse.mel_to_audio(inv_mel_spectrogram, sr=44100, n_fft=2048, hop_length=512)
-
-# Save the audio signal to a file
-output_audio_path = "/kaggle/working/fake_audio3.wav"  # Replace with the desired output path
-sf.write(output_audio_path, audio_signal, 44100)  # Adjust the sample rate if needed
-
-# Specify the path to your WAV file
-wav_file_path = "/kaggle/working/fake_audio3.wav"
-
-# Load the WAV file
-audio = AudioSegment.from_wav(wav_file_path)
-
-# Play the audio
-play(audio)
+if spectrogram_mode == 'rgb':
+    # Undo the ImageNet normalization and quantize to uint8 in one pass over the batch
+    fake_uint8 = batch_transform.to_uint8(fake_images)
+    #Showing the fake images generated
+    show_images(fake_uint8)
+    # Save the generated fake image
+    write_png(make_grid(fake_uint8, nrow=8).cpu(), output_path)
+else:
+    show_images((fake_images))
+    save_image(fake_images, output_path, normalize=True)
+
+# Griffin-Lim settings shared by both modes; the inverter caches the mel pseudo-inverse per (sr, n_fft, n_mels)
+# and vocodes a whole batch of spectrograms at once
+# Fast (momentum) Griffin-Lim from a phase-gradient initialization converges in far fewer iterations
+# than plain Griffin-Lim from random phase; use momentum=0.0 and init='random' for the plain algorithm
+griffin_lim_iterations = 16
+griffin_lim_tolerance = 1e-4
+phase_options = {'momentum': 0.99, 'init': 'pghi'}
+
+if spectrogram_mode == 'native':
+    # The generator output is the normalized log-mel itself, so the dB values are recovered exactly
+    log_mels = denormalize_db(fake_images[:, 0].detach().cpu().numpy())
+    audio_sample_rate = SAMPLE_RATE
+    inverter = MelInverter(audio_sample_rate, N_FFT, HOP_LENGTH, N_MELS, n_iter=griffin_lim_iterations,
+                           tol=griffin_lim_tolerance, device=device, **phase_options)
+    audio_signal = inverter(log_mel_to_power(log_mels))[0]
+else:
+    def images_to_mel_power(images):
+        """
+        Mel power spectrograms of generated RGB images: their [0, 1] grayscale values, as the saved PNG holds them.
+        """
+        grayscale = batch_transform.to_uint8(images).float().mean(dim=1) / 255
+        # Invert the power-to-db transformation
+        return librosa.db_to_power(grayscale.cpu().numpy())
+
+    spectrogram = images_to_mel_power(fake_images)[0]
+
+    # Invert the mel spectrogram to the time-domain signal: cached pseudo-inverse, then Griffin-Lim
+    audio_sample_rate = 44100  # Adjust the sample rate if needed
+    inverter = MelInverter(audio_sample_rate, n_fft=2048, hop_length=512, n_mels=256,
+                           n_iter=griffin_lim_iterations, tol=griffin_lim_tolerance, device=device, **phase_options)
+    audio_signal = inverter(spectrogram)
+
+# To compare clips/sec with per-clip librosa.feature.inverse.mel_to_audio (native mode, ideally on a larger batch):
+# benchmark_inversion(log_mel_to_power(log_mels), SAMPLE_RATE, device=device)
+# Spectral convergence vs wall time of librosa, plain, fast and fast+PGHI Griffin-Lim at 4-32 iterations:
+# benchmark_phase_reconstruction(log_mel_to_power(log_mels), SAMPLE_RATE, device=device)
+
+# Export the generated audio straight from memory: files are written from a thread pool, with no
+# read-back or playback, so this also runs in headless batch jobs. Listen in a notebook with
+# IPython.display.Audio(audio_signal, rate=audio_sample_rate) if needed
+output_audio_dir = "/kaggle/working/fake_audio"  # Replace with the desired output directory
+audio_paths = export_batch([audio_signal], output_audio_dir, audio_sample_rate, prefix="fake_audio",
+                           target_dbfs=-20.0)
+
+# Batch generation: fakes go straight from the generator through the vocoder to files
+num_exported_batches = 0
+export_batch_size = 64
+for batch_index in range(num_exported_batches):
+    with torch.no_grad():
+        fake_batch = GeneratorI(torch.randn(export_batch_size, 256, 1, 1, device=device))
+    if spectrogram_mode == 'native':
+        mel_batch = log_mel_to_power(denormalize_db(fake_batch[:, 0].cpu().numpy()))
+    else:
+        mel_batch = images_to_mel_power(fake_batch)
+    export_batch(inverter(mel_batch), output_audio_dir, audio_sample_rate, prefix="fake_batch",
+                 audio_format="flac", target_dbfs=-20.0, start_index=batch_index * export_batch_size)
 
 CONFIG = {"train_data_dir": "data/Language Identification/spectrograms new/train",
         #   "validation_data_dir": "<path to dataset dir>/validation.csv",
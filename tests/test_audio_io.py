@@ -0,0 +1,94 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from adversarial_audio.audio_io import (export_batch, iter_note_blocks, normalize_loudness, peak_gain, render_notes,
+                                        trim_notes)
+
+SAMPLING_RATE = 8000
+# Sorted by start; dyadic times so every note boundary is an exact sample index
+PITCH = np.array([60, 64, 67, 72], dtype=np.int16)
+START = np.array([0.0, 0.0625, 0.25, 0.28125])
+END = np.array([0.5, 0.125, 0.3125, 0.875])
+VELOCITY = np.array([100, 80, 60, 127], dtype=np.float32)
+NOTES = (PITCH, START, END, VELOCITY)
+
+
+def _one_shot_render(pitch, start, end, velocity, sampling_rate):
+    """Reference: every note synthesized over its whole extent into one buffer."""
+    gain = peak_gain(start, end, velocity)
+    audio = np.zeros(int(np.ceil(end.max() * sampling_rate)), dtype=np.float32)
+    for p, s, e, v in zip(pitch, start, end, velocity):
+        lo, hi = int(np.floor(s * sampling_rate)), int(np.floor(e * sampling_rate))
+        frequency = 440.0 * 2.0 ** ((float(p) - 69) / 12)
+        samples = np.arange(hi - lo, dtype=np.float64)
+        audio[lo:hi] += (v / 127.0 * gain * np.sin(2 * np.pi * frequency * samples / sampling_rate)).astype(np.float32)
+    return audio
+
+
+def test_peak_gain_is_the_inverse_of_the_loudest_chord():
+    # Notes 0, 2 and 3 overlap in [0.28125, 0.3125)
+    assert peak_gain(START, END, VELOCITY) == pytest.approx(127 / 287)
+    assert peak_gain(START[:0], END[:0], VELOCITY[:0]) == 1.0
+
+
+@pytest.mark.parametrize('block_seconds', [0.01, 0.037, 0.25, 10.0])
+def test_blocks_match_a_one_shot_render(block_seconds):
+    blocks = list(iter_note_blocks(*NOTES, sampling_rate=SAMPLING_RATE, block_seconds=block_seconds))
+    block_size = int(block_seconds * SAMPLING_RATE)
+    assert all(len(block) <= block_size for block in blocks)
+    audio = np.concatenate(blocks)
+    np.testing.assert_allclose(audio, _one_shot_render(*NOTES, SAMPLING_RATE), atol=1e-6)
+    assert np.abs(audio).max() <= 1.0
+
+
+def test_max_seconds_stops_rendering():
+    audio = np.concatenate(list(iter_note_blocks(*NOTES, sampling_rate=SAMPLING_RATE, block_seconds=0.1,
+                                                 max_seconds=0.25)))
+    np.testing.assert_allclose(audio, _one_shot_render(*NOTES, SAMPLING_RATE)[:2000], atol=1e-6)
+
+
+def test_trim_notes_keeps_the_notes_sounding_in_the_window():
+    pitch, start, end, velocity = trim_notes(*NOTES, 0.25, 0.5)
+    assert pitch.tolist() == [60, 67, 72]
+    assert start.tolist() == [-0.25, 0.0, 0.03125]
+    assert end.tolist() == [0.25, 0.0625, 0.625]
+    assert velocity.tolist() == [100, 60, 127]
+
+
+def test_render_notes_matches_the_window_of_the_whole_piece():
+    # The trimmed notes keep the loudest chord, so the gain is the same as for the whole piece
+    window = render_notes(*NOTES, seconds=0.25, start_seconds=0.25, sampling_rate=SAMPLING_RATE)
+    np.testing.assert_allclose(window, _one_shot_render(*NOTES, SAMPLING_RATE)[2000:4000], atol=1e-6)
+
+
+def test_normalize_loudness_reaches_the_target_rms():
+    t = np.arange(8000) / SAMPLING_RATE
+    audio = 0.1 * np.sin(2 * np.pi * 440 * t)
+    normalized = normalize_loudness(audio, target_dbfs=-20.0)
+    assert normalized.dtype == np.float32
+    assert np.sqrt(np.mean(np.square(normalized, dtype=np.float64))) == pytest.approx(0.1, rel=1e-4)
+
+
+def test_normalize_loudness_limits_the_peak():
+    audio = np.zeros(1000, dtype=np.float32)
+    audio[0] = 1.0
+    normalized = normalize_loudness(audio, target_dbfs=-20.0, peak_dbfs=-1.0)
+    assert np.abs(normalized).max() == pytest.approx(10 ** (-1 / 20), rel=1e-6)
+    np.testing.assert_array_equal(normalize_loudness(np.zeros(10)), np.zeros(10))
+
+
+def test_export_batch_writes_named_files(tmp_path):
+    sf = pytest.importorskip('soundfile')
+    waveforms = np.stack([np.full(800, 0.25, dtype=np.float32), np.full(800, -0.5, dtype=np.float32)])
+    paths = export_batch(waveforms, str(tmp_path), SAMPLING_RATE, subtype='FLOAT', names=['first', 'second'])
+    assert [path.split('/')[-1] for path in paths] == ['first.wav', 'second.wav']
+    for path, expected in zip(paths, waveforms):
+        audio, samplerate = sf.read(path, dtype='float32')
+        assert samplerate == SAMPLING_RATE
+        np.testing.assert_array_equal(audio, expected)
+
+    paths = export_batch(waveforms, str(tmp_path), SAMPLING_RATE, prefix='clip', audio_format='flac', start_index=7)
+    assert [path.split('/')[-1] for path in paths] == ['clip_00007.flac', 'clip_00008.flac']
+    with pytest.raises(ValueError):
+        export_batch(waveforms, str(tmp_path), SAMPLING_RATE, audio_format='mp3')
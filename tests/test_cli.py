@@ -0,0 +1,63 @@
+import pytest
+
+from adversarial_audio import cli
+
+
+def test_every_command_has_a_handler_and_modules():
+    assert set(cli.COMMAND_MODULES) == set(cli.COMMAND_HANDLERS)
+
+
+@pytest.mark.parametrize('argv, key', [
+    (['featurize', 'wavs', 'features'], 'featurize'),
+    (['train', 'spectogan', '--features', 'features'], 'train-spectogan'),
+    (['train', 'pianogan', '--midi-dir', 'maestro'], 'train-pianogan'),
+    (['generate', 'spectogan'], 'generate-spectogan'),
+    (['generate', 'pianogan'], 'generate-pianogan'),
+    (['vocode', 'a.npy', 'b.npy'], 'vocode'),
+])
+def test_parser_maps_subcommands_to_keys(argv, key):
+    args = cli.build_parser().parse_args(argv)
+    assert args.key == key
+
+
+def test_parser_defaults_and_options():
+    args = cli.build_parser().parse_args(['train', 'spectogan', '--features', 'f', '--frames', '64',
+                                          '--precision', 'bf16', '--channels-last', '--workers', '2'])
+    assert (args.frames, args.precision, args.channels_last, args.workers) == (64, 'bf16', True, 2)
+    assert args.batch_size == 32
+
+    args = cli.build_parser().parse_args(['vocode', 'x.npy'])
+    assert args.inputs == ['x.npy']
+    assert (args.momentum, args.init, args.tol) == (0.99, 'pghi', None)
+
+
+@pytest.mark.parametrize('argv', [
+    [],
+    ['train'],
+    ['train', 'spectogan'],
+    ['generate', 'other'],
+    ['vocode'],
+    ['vocode', 'x.npy', '--init', 'zeros'],
+])
+def test_parser_rejects_invalid_command_lines(argv):
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(argv)
+
+
+def test_startup_benchmark_rejects_unknown_commands():
+    with pytest.raises(SystemExit, match='unknown subcommands: nope'):
+        cli.main(['startup-benchmark', 'nope'])
+
+
+def test_parsing_imports_no_heavy_modules():
+    import os
+    import subprocess
+    import sys
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = ('import sys; from adversarial_audio.cli import HEAVY_MODULES, build_parser; '
+            'build_parser().parse_args(["vocode", "x.npy"]); '
+            'print(",".join(m for m in HEAVY_MODULES if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=repo_root)
+    assert result.stdout.strip() == ''
@@ -0,0 +1,69 @@
+import csv
+import json
+
+import pytest
+
+from adversarial_audio.metrics_log import MetricsLogger, epoch_summary, read_metrics
+
+
+def _read_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_csv_rows_are_buffered_until_flush(tmp_path):
+    path = tmp_path / 'logs' / 'metrics.csv'
+    logger = MetricsLogger(str(path), flush_every=3)
+    logger.log(epoch=0, step=1, loss=0.5)
+    logger.log(epoch=0, step=2, loss=0.25)
+    assert not path.exists()
+    logger.log(epoch=0, step=3, loss=0.125)
+    assert [row['step'] for row in _read_csv(path)] == ['1', '2', '3']
+
+
+def test_appending_keeps_the_existing_header(tmp_path):
+    path = str(tmp_path / 'metrics.csv')
+    with MetricsLogger(path) as logger:
+        logger.log(epoch=0, step=1, loss=1.0)
+    # A resumed run appends, with its columns in a different order and an extra one
+    with MetricsLogger(path) as logger:
+        logger.log(loss=2.0, step=2, epoch=1, extra=5)
+    with open(path) as f:
+        assert f.readline().strip() == 'epoch,step,loss'
+    assert _read_csv(path) == [{'epoch': '0', 'step': '1', 'loss': '1.0'},
+                               {'epoch': '1', 'step': '2', 'loss': '2.0'}]
+
+
+def test_reset_starts_a_fresh_log(tmp_path):
+    path = str(tmp_path / 'metrics.csv')
+    with MetricsLogger(path) as logger:
+        logger.log(epoch=0, step=1, loss=1.0)
+    # A new run that does not resume replaces the old rows, header included
+    with MetricsLogger(path) as logger:
+        logger.reset()
+        logger.log(step=1, epoch=0, loss=3.0)
+    assert _read_csv(path) == [{'step': '1', 'epoch': '0', 'loss': '3.0'}]
+
+
+def test_jsonl_log(tmp_path):
+    path = str(tmp_path / 'metrics.jsonl')
+    with MetricsLogger(path) as logger:
+        logger.log(epoch=0, step=1, loss=1.5)
+        logger.log(epoch=0, step=2, loss=0.5, note='x')
+    with open(path) as f:
+        rows = [json.loads(line) for line in f]
+    assert rows == [{'epoch': 0, 'step': 1, 'loss': 1.5}, {'epoch': 0, 'step': 2, 'loss': 0.5, 'note': 'x'}]
+
+
+def test_epoch_summary_uses_the_last_attempt_of_each_step(tmp_path):
+    pytest.importorskip('pandas')
+    path = str(tmp_path / 'metrics.csv')
+    with MetricsLogger(path) as logger:
+        logger.log(epoch=0, step=1, loss=1.0)
+        logger.log(epoch=0, step=2, loss=3.0)
+        logger.log(epoch=1, step=3, loss=10.0)
+        # Epoch 1 logged again after resuming from the epoch 0 checkpoint
+        logger.log(epoch=1, step=3, loss=4.0)
+        logger.log(epoch=1, step=4, loss=6.0)
+    summary = epoch_summary(read_metrics(path), ['loss'])
+    assert summary['loss'].tolist() == [2.0, 5.0]
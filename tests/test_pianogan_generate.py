@@ -0,0 +1,41 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from adversarial_audio.pianogan_generate import postprocess
+from adversarial_audio.pianogan_notes import NOTE_DTYPE
+
+
+def test_pitch_only_outputs_get_constant_timing():
+    notes = postprocess(np.array([[0.5, 0.25, 1.2, -0.1]]), vocab_size=128, step=0.025, duration=0.3)
+    assert notes.dtype == NOTE_DTYPE
+    assert notes.shape == (1, 4)
+    # Scaled, rounded and clipped to the MIDI range
+    assert notes['pitch'][0].tolist() == [64, 32, 127, 0]
+    np.testing.assert_allclose(notes['start'][0], [0.025, 0.05, 0.075, 0.1])
+    np.testing.assert_allclose(notes['step'][0], 0.025)
+    np.testing.assert_allclose(notes['duration'][0], 0.3)
+    np.testing.assert_allclose(notes['end'], notes['start'] + 0.3)
+
+
+def test_joint_outputs_carry_their_own_timing():
+    samples = np.array([[[0.5, 0.1, 0.2],
+                         [0.5, -0.2, 0.001],
+                         [0.5, 0.5, 1.5]]])
+    notes = postprocess(samples, vocab_size=128, min_duration=0.01)
+    assert notes.shape == (1, 3)
+    assert notes['pitch'][0].tolist() == [64, 64, 64]
+    # Negative steps are clipped to 0 and durations to at least min_duration
+    np.testing.assert_allclose(notes['start'][0], [0.1, 0.1, 0.6])
+    np.testing.assert_allclose(notes['end'][0], [0.3, 0.11, 2.1])
+    np.testing.assert_allclose(notes['step'][0], [0.1, 0.0, 0.5])
+    np.testing.assert_allclose(notes['duration'][0], [0.2, 0.01, 1.5])
+
+
+def test_grid_snaps_start_and_end_times():
+    grid = 0.05
+    rng = np.random.default_rng(0)
+    notes = postprocess(rng.uniform(0, 1, size=(4, 16, 3)), grid=grid)
+    for field in ('start', 'end'):
+        np.testing.assert_allclose(notes[field] / grid, np.rint(notes[field] / grid), atol=1e-9)
+    assert (notes['end'] - notes['start'] >= grid - 1e-9).all()
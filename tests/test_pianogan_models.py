@@ -0,0 +1,31 @@
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+from adversarial_audio.pianogan_models import LazyModel, build_model
+
+
+def test_every_kind_takes_the_same_size_keywords():
+    shapes = {kind: build_model(kind, latent_dim=16, seq_len=32).input_shape
+              for kind in ('generator', 'discriminator', 'joint_generator', 'joint_discriminator')}
+    assert shapes == {'generator': (None, 16), 'discriminator': (None, 32),
+                      'joint_generator': (None, 16), 'joint_discriminator': (None, 32, 3)}
+
+
+def test_missing_sizes_are_named():
+    with pytest.raises(ValueError, match='latent_dim'):
+        build_model('joint_generator', seq_len=32)
+
+
+def test_cached_rebuild_has_the_same_architecture():
+    first = build_model('joint_generator', latent_dim=8, seq_len=32)
+    second = build_model('joint_generator', latent_dim=8, seq_len=32)
+    assert second is not first
+    assert second.to_json() == first.to_json()
+
+
+def test_lazy_model_builds_on_first_call():
+    model = build_model('joint_generator', latent_dim=8, seq_len=32, lazy=True)
+    assert isinstance(model, LazyModel) and not model.built
+    assert model(tf.zeros((2, 8)), training=False).shape == (2, 32, 3)
+    assert model.built
@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+tf = pytest.importorskip('tensorflow')
+
+from adversarial_audio.pianogan_windows import (_legacy_training_dataset, create_training_dataset,
+                                                notes_to_matrix)
+
+N_NOTES = 40
+SEQ_LENGTH = 8
+
+
+@pytest.fixture
+def matrix():
+    return np.arange(N_NOTES * 3, dtype=np.float32).reshape(N_NOTES, 3)
+
+
+def test_one_window_per_start(matrix):
+    dataset = create_training_dataset(matrix, SEQ_LENGTH, batch_size=1, shuffle=False)
+    assert int(dataset.cardinality()) == N_NOTES - SEQ_LENGTH
+    for start, (inputs, labels) in enumerate(dataset):
+        np.testing.assert_array_equal(inputs[0], matrix[start:start + SEQ_LENGTH])
+        np.testing.assert_array_equal(labels[0], matrix[start + SEQ_LENGTH])
+
+
+def test_full_batches_only(matrix):
+    dataset = create_training_dataset(matrix, SEQ_LENGTH, batch_size=5, seed=0)
+    assert int(dataset.cardinality()) == (N_NOTES - SEQ_LENGTH) // 5
+    inputs, labels = next(iter(dataset))
+    assert inputs.shape == (5, SEQ_LENGTH, 3)
+    assert labels.shape == (5, 3)
+
+
+def test_matches_the_legacy_pipeline(matrix):
+    def windows(dataset):
+        return sorted((tuple(inputs[0].numpy().tolist()), float(labels[0])) for inputs, labels in dataset)
+
+    fused = create_training_dataset(matrix, SEQ_LENGTH, batch_size=1, feature='pitch', seed=0)
+    legacy = _legacy_training_dataset(matrix, SEQ_LENGTH, batch_size=1, feature='pitch')
+    assert windows(fused) == windows(legacy)
+
+
+def test_notes_to_matrix_scales_pitch():
+    notes = np.zeros(2, dtype=[('pitch', np.int16), ('step', np.float64), ('duration', np.float64)])
+    notes['pitch'] = [64, 32]
+    notes['step'] = [0.5, 0.25]
+    notes['duration'] = [1.0, 2.0]
+    matrix = notes_to_matrix(notes, vocab_size=128)
+    assert matrix.dtype == np.float32
+    np.testing.assert_array_equal(matrix, [[0.5, 0.5, 1.0], [0.25, 0.25, 2.0]])
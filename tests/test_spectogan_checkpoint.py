@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from adversarial_audio.spectogan_checkpoint import CheckpointManager
+
+
+def test_rotation_keeps_the_last_checkpoints(tmp_path):
+    unrelated = tmp_path / 'checkpoint_notes.txt'
+    unrelated.write_text('keep me')
+    manager = CheckpointManager(str(tmp_path), keep_last=2)
+    try:
+        assert manager.load_latest() is None
+        for step in range(1, 6):
+            manager.save(step, {'step': step, 'weights': torch.full((2,), float(step))})
+        manager.wait()
+        assert [os.path.basename(path) for path in manager.checkpoints()] == ['checkpoint_000000004.pt',
+                                                                             'checkpoint_000000005.pt']
+        state = manager.load_latest()
+        assert state['step'] == 5
+        torch.testing.assert_close(state['weights'], torch.full((2,), 5.0))
+    finally:
+        manager.close()
+    assert unrelated.read_text() == 'keep me'
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path))
+
+
+def test_saved_state_is_a_snapshot(tmp_path):
+    manager = CheckpointManager(str(tmp_path))
+    weights = torch.zeros(3)
+    manager.save(1, {'weights': weights})
+    # Training keeps updating the tensors while the save is in flight
+    weights += 1
+    state = manager.load_latest()
+    manager.close()
+    torch.testing.assert_close(state['weights'], torch.zeros(3))
+
+
+def test_keep_last_must_keep_a_checkpoint(tmp_path):
+    with pytest.raises(ValueError):
+        CheckpointManager(str(tmp_path), keep_last=0)
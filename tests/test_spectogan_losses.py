@@ -0,0 +1,36 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+import torch.nn.functional as F
+
+from adversarial_audio.spectogan_losses import LabelNoiseLoss
+
+
+def test_label_noise_is_drawn_in_one_batched_sample():
+    criterion = LabelNoiseLoss('cpu')
+    noise = criterion.sample((3, 8, 9))
+    assert noise.shape == (3, 8, 9)
+    assert ((noise >= 0) & (noise <= 1)).all()
+
+
+def test_real_and_fake_targets():
+    criterion = LabelNoiseLoss('cpu')
+    outputs = torch.tensor([0.2, 0.7, 0.9])
+    noise = torch.tensor([0.1, 0.0, 0.3])
+    torch.testing.assert_close(criterion.real_loss(outputs, noise), F.binary_cross_entropy(outputs, 1.0 - noise))
+    torch.testing.assert_close(criterion.fake_loss(outputs, noise), F.binary_cross_entropy(outputs, noise))
+    torch.testing.assert_close(criterion.scores(outputs), outputs)
+
+
+def test_logits_match_probabilities():
+    logits = torch.tensor([-2.0, 0.5, 3.0])
+    noise = torch.tensor([0.05, 0.2, 0.4])
+    with_logits = LabelNoiseLoss('cpu', with_logits=True)
+    with_probabilities = LabelNoiseLoss('cpu')
+    probabilities = torch.sigmoid(logits)
+    torch.testing.assert_close(with_logits.real_loss(logits, noise),
+                               with_probabilities.real_loss(probabilities, noise))
+    torch.testing.assert_close(with_logits.fake_loss(logits, noise),
+                               with_probabilities.fake_loss(probabilities, noise))
+    torch.testing.assert_close(with_logits.scores(logits), probabilities)
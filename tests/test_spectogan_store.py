@@ -0,0 +1,59 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from torch.utils.data import DataLoader
+
+from adversarial_audio.spectogan_store import (MemmapSpectrogramDataset, collate_batch, default_num_workers,
+                                               make_dataloader, pack_dataset)
+
+
+@pytest.fixture
+def items():
+    generator = torch.Generator().manual_seed(0)
+    return [torch.randn(1, 4, 5, generator=generator) for _ in range(7)]
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float16'])
+def test_store_round_trip(tmp_path, items, dtype):
+    names = [f'clip_{i}' for i in range(len(items))]
+    store = pack_dataset(items, str(tmp_path / 'store'), dtype=dtype, names=names, verbose=False)
+    dataset = MemmapSpectrogramDataset(store)
+    expected = [item.to(getattr(torch, dtype)) for item in items]
+
+    assert len(dataset) == len(items)
+    assert dataset.index['names'] == names
+    for i, item in enumerate(expected):
+        torch.testing.assert_close(dataset[i], item)
+
+    batch = collate_batch(dataset.__getitems__([4, 0, 6]))
+    assert batch.shape == (3, 1, 4, 5)
+    torch.testing.assert_close(batch, torch.stack([expected[4], expected[0], expected[6]]))
+
+
+def test_collate_batch(items):
+    batch = collate_batch(items[:3])
+    torch.testing.assert_close(batch, torch.stack(items[:3]))
+    # Batches already gathered by the dataset pass through unchanged
+    assert collate_batch(batch) is batch
+
+
+@pytest.mark.parametrize('num_workers', [0, 2])
+def test_dataloader_serves_every_item_once(tmp_path, items, num_workers):
+    store = pack_dataset(items, str(tmp_path / 'store'), dtype='float32', verbose=False)
+    dataloader = make_dataloader(MemmapSpectrogramDataset(store), batch_size=3, shuffle=False,
+                                 num_workers=num_workers, pin_memory=False)
+    for _ in range(2):
+        batches = list(dataloader)
+        assert [len(batch) for batch in batches] == [3, 3, 1]
+        torch.testing.assert_close(torch.cat(batches), torch.stack(items))
+
+
+def test_plain_dataloader_accepts_gathered_batches(tmp_path, items):
+    store = pack_dataset(items, str(tmp_path / 'store'), dtype='float32', verbose=False)
+    dataloader = DataLoader(MemmapSpectrogramDataset(store), batch_size=3, shuffle=False)
+    torch.testing.assert_close(torch.cat(list(dataloader)), torch.stack(items))
+
+
+def test_default_num_workers_leaves_a_core_for_training():
+    assert 0 <= default_num_workers(max_workers=4) <= 4
@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+torch = pytest.importorskip('torch')
+Image = pytest.importorskip('PIL.Image')
+
+from adversarial_audio.spectogan_transforms import IMAGENET_MEAN, IMAGENET_STD, BatchTransform, pil_to_uint8
+
+# Two uint8 levels after normalization; PIL and torch round the resized pixels slightly differently
+TOLERANCE = 2 / (255 * min(IMAGENET_STD))
+
+
+@pytest.fixture
+def images():
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 256, shape, dtype=np.uint8))
+            for shape in [(40, 60, 3), (40, 60, 3), (32, 32, 3), (50, 30, 3)]]
+
+
+def _per_image(image, size):
+    # What Compose([Resize(size), ToTensor(), Normalize(mean, std)]) computes for a PIL image
+    resized = np.asarray(image.resize(size[::-1], Image.BILINEAR), dtype=np.float32) / 255
+    normalized = (resized - np.array(IMAGENET_MEAN)) / np.array(IMAGENET_STD)
+    return torch.from_numpy(normalized.astype(np.float32)).permute(2, 0, 1)
+
+
+def test_matches_the_per_image_pipeline(images):
+    size = (32, 32)
+    expected = torch.stack([_per_image(image, size) for image in images])
+    actual = BatchTransform(size)([pil_to_uint8(image) for image in images])
+    assert actual.shape == (4, 3, 32, 32)
+    assert (actual - expected).abs().max() <= TOLERANCE
+
+
+def test_to_uint8_inverts_normalization(images):
+    transform = BatchTransform((32, 32))
+    uint8_images = [pil_to_uint8(images[2])]
+    torch.testing.assert_close(transform.to_uint8(transform(uint8_images)), uint8_images[0][None])
+    assert transform.latency_summary()['batches'] == 2